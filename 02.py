@@ -1,16 +1,38 @@
 from itertools import product
 
 from intcode import IntCode
+from intcode_cache import ResultCache
+from intcode_symbolic import NotSymbolic, Poly, run_symbolic, solve
 
 with open('02.input') as f:
     program = IntCode.from_file(f)
+results = ResultCache(program)
+
+
+def run(noun, verb):
+    return results.run(mem={1: noun, 2: verb}, peek=[0]).peek[0]
+
+
+def search(target):
+    """Find noun, verb by solving memory[0] as a polynomial in them."""
+    memory, _ = run_symbolic(program, {1: 'noun', 2: 'verb'})
+    if not isinstance(memory[0], (int, Poly)):
+        raise NotSymbolic(f'memory[0] is {memory[0]}')
+    for found in solve(memory[0], target,
+                       {'noun': range(100), 'verb': range(100)}):
+        return found['noun'], found['verb']
+    raise ValueError(f'No noun, verb gives {target}')
+
 
 # part 1
-print(program.setup(mem={1: 12, 2: 2}).run().memory[0])
+print(run(12, 2))
 
 # part 2
 target = 19690720
-for noun, verb in product(range(100), range(100)):
-    if program.setup(mem={1: noun, 2: verb}).run().memory[0] == target:
-        break
+try:
+    noun, verb = search(target)
+except NotSymbolic:  # fall back to trying them all
+    for noun, verb in product(range(100), range(100)):
+        if run(noun, verb) == target:
+            break
 print(100 * noun + verb)
@@ -1,38 +1,43 @@
 import itertools
-from multiprocessing import Queue
 
 from intcode import IntCode
+from intcode_cache import ResultCache
+from intcode_network import Network
+from intcode_pool import pool_map
 
 
-def run_amps(program, phase_setting):
-    n = 0
-    for p in phase_setting:
-        n = program.setup(inputs=[p, n], outputs=[]).run().outputs.pop()
-    return n
+def max_amps(amps, phases, n=0):
+    """Return max. output from chaining amps over all orders of 'phases'.
+
+    The permutations are walked as a trie, so the amps for a common prefix of
+    phase settings are only run once.
+    """
+    if not phases:
+        return n
+    return max(
+        max_amps(amps, phases - {p}, amps.run([p, n]).outputs[-1])
+        for p in phases)
 
 
 def run_amps_w_feedback(program, phase_setting):
     n = len(phase_setting)  # How many amps?
-    qs = [Queue() for _ in range(n)]  # Queue #i between amps #i-1 and #i
-    for i, p in enumerate(phase_setting):
-        qs[i].put(p)  # First input to each amp is phase
-    qs[0].put(0)  # The first amp take an additional 0 as input
-    amps = [
-        program.start_in_subprocess(qs[i], qs[(i + 1) % n])[0]
-        for i in range(n)
-    ]
-    for amp in amps:
-        amp.join()
-    return qs[0].get()
-
-
-with open('07.input') as f:
-    program = IntCode.from_file(f)
-
-# part 1
-phase_permutations = itertools.permutations(list(range(5)), 5)
-print(max(run_amps(program, phases) for phases in phase_permutations))
-
-# part 2
-phase_permutations = itertools.permutations(list(range(5, 10)), 5)
-print(max(run_amps_w_feedback(program, p) for p in phase_permutations))
+    network = Network()
+    for p in phase_setting:
+        network.add(program.fork(), [p])  # First input to each amp is phase
+    for i in range(n):  # Connect amp #i to amp #i+1
+        network.connect(i, (i + 1) % n)
+    network.send(0, [0])  # The first amp take an additional 0 as input
+    network.run()
+    return network.machines[0].pending.popleft()
+
+
+if __name__ == '__main__':  # not in workers started by 'spawn'
+    with open('07.input') as f:
+        program = IntCode.from_file(f)
+
+    # part 1
+    print(max_amps(ResultCache(program), set(range(5))))
+
+    # part 2
+    phase_permutations = itertools.permutations(list(range(5, 10)), 5)
+    print(max(pool_map(run_amps_w_feedback, program, phase_permutations)))
@@ -1,10 +1,13 @@
-from collections import defaultdict, namedtuple
+from collections import namedtuple
 from dataclasses import dataclass
-import queue
 
+from grid import Grid
 from intcode import IntCode
+from intcode_network import Network
+from render import bbox, rows
 
 Point = namedtuple('Point', ['x', 'y'])
+WHITE, PAINTED = 1, 2  # bits in hull cells
 
 
 @dataclass
@@ -26,40 +29,26 @@ class Robot:
 
 def paint_hull(program, start_color=0):
     robot = Robot()
-    hull = defaultdict(int)  # map points -> color: 0 for black, 1 for white
+    hull = Grid()  # map points -> WHITE/PAINTED bits, 0 for unpainted black
     hull[robot.pos] = start_color
-    proc, in_q, out_q = program.start_in_subprocess()
-    try:
-        while True:
-            in_q.put(hull[robot.pos])
-            hull[robot.pos] = out_q.get(timeout=1)
-            robot.turn(out_q.get(timeout=1))
-            robot.move()
-    except queue.Empty:
-        proc.join()
-    return hull
 
+    def paint(outputs):
+        for color, lr in zip(*[iter(outputs)] * 2):
+            hull[robot.pos] = PAINTED | color
+            robot.turn(lr)
+            robot.move()
+        network.send(0, [hull[robot.pos] & WHITE])  # ignored once halted
 
-def bbox(pixels):
-    x_min, x_max, y_min, y_max = None, None, None, None
-    for p in pixels:
-        if x_min is None or p.x < x_min:
-            x_min = p.x
-        if x_max is None or p.x > x_max:
-            x_max = p.x
-        if y_min is None or p.y < y_min:
-            y_min = p.y
-        if y_max is None or p.y > y_max:
-            y_max = p.y
-    return Point(x_min, y_min), Point(x_max, y_max)
+    network = Network()
+    network.add(program.fork(), [start_color], paint)
+    network.run()  # until the robot program halts
+    return hull
 
 
-def draw(pixels):
-    botleft, topright = bbox(pixels)
-    for y in range(topright.y, botleft.y - 1, -1):
-        for x in range(botleft.x, topright.x + 1):
-            print('██' if Point(x, y) in pixels else '  ', end='')
-        print()
+def draw(hull):
+    white = bbox(p for p, c in hull.items() if c & WHITE)
+    pixels = ['  ', '██', '  ', '██']  # by hull cell
+    print('\n'.join(rows(hull, pixels, white, flip=True)))
 
 
 with open('11.input') as f:
@@ -67,9 +56,8 @@ with open('11.input') as f:
 
 # part 1
 hull = paint_hull(program)
-print(len(hull))
+print(sum(1 for _, c in hull.items() if c & PAINTED))
 
 # part 2
 hull = paint_hull(program, 1)
-white_pixels = {p for p, c in hull.items() if c}
-draw(white_pixels)
+draw(hull)
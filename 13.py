@@ -1,40 +1,44 @@
-from functools import partial
-from time import sleep
+import sys
 
+from grid import Grid
 from intcode import IntCode
+from render import Screen, rows
 
 
 class Game:
-    Tiles = [' ', '#', '█', '-', 'O']
+    Tiles = ' #█-O'
 
-    def __init__(self):
-        self.tiles = {}  # (x, y) -> tile
+    def __init__(self, screen=None):
+        self.tiles = Grid(64, 32)  # (x, y) -> tile
         self.score = 0
         self.ball = 0  # x coord of ball
         self.paddle = 0  # x coord of paddle
         self._buffer = []
+        self.screen = screen  # a render.Screen; headless if None
 
     def set_tile(self, x, y, tile):
         if x == -1 and y == 0:
             self.score = tile
         else:
             assert x >= 0 and y >= 0 and tile in range(5)
-            self.tiles[(x, y)] = tile
+            self.tiles[x, y] = tile
             if tile == 3:
                 self.paddle = x
             elif tile == 4:
                 self.ball = x
 
     def size(self):
-        return tuple(max(i) for i in zip(*self.tiles.keys()))
+        if self.tiles.hi is None:
+            return 0, 0
+        return self.tiles.hi[0] + 1, self.tiles.hi[1] + 1
 
-    def draw(self):
+    def frame(self):
         w, h = self.size()
-        print(f'Score: {self.score}')
-        for y in range(h):
-            for x in range(w):
-                print(self.Tiles[self.tiles.get((x, y), 0)], end='')
-            print('#')
+        return [f'Score: {self.score}'] + rows(
+            self.tiles, self.Tiles, ((0, 0), (w - 1, h - 1)))
+
+    def count(self, tile):
+        return self.tiles.cells.count(tile)
 
     def buffer(self, n):
         self._buffer.append(n)
@@ -42,10 +46,9 @@ class Game:
             self.set_tile(*self._buffer)
             self._buffer = []
 
-    def interact(self, draw):
-        if draw:
-            self.draw()
-            sleep(0.02)
+    def interact(self):
+        if self.screen is not None:
+            self.screen.show(self.frame())
         if self.ball < self.paddle:
             return -1
         elif self.ball > self.paddle:
@@ -53,8 +56,8 @@ class Game:
         else:
             return 0
 
-    def run(self, program, draw=True):
-        program.setup(partial(self.interact, draw), self.buffer).run()
+    def run(self, program):
+        program.setup(self.interact, self.buffer).run()
 
 
 with open('13.input') as f:
@@ -63,9 +66,9 @@ with open('13.input') as f:
 # part 1
 game = Game()
 game.run(program)
-print(sum(map(lambda t: t == 2, game.tiles.values())))
+print(game.count(2))
 
-# part 2
-game = Game()
-game.run(program.setup(mem={0: 2}), draw=False)
+# part 2 ('python3 13.py watch' to watch it being played)
+game = Game(Screen(fps=50) if sys.argv[1:] == ['watch'] else None)
+game.run(program.setup(mem={0: 2}))
 print(game.score)
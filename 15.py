@@ -1,50 +1,26 @@
 from collections import namedtuple
 from itertools import chain
-from time import sleep
-import sys
 
 from intcode import IntCode
+from intcode_pool import Pool
+from render import Bounds, Screen, rows, style
 
 Coord = namedtuple('Coord', ['x', 'y'])
 Open, Wall, Oxygen = 0, 1, 2
 
 
-def bbox(coords):
-    xmin = xmax = ymin = ymax = 0
-    for coord in coords:
-        if coord is None:
-            continue
-        x, y = coord
-        xmin, xmax = min(xmin, x), max(xmax, x)
-        ymin, ymax = min(ymin, y), max(ymax, y)
-    return Coord(xmin, ymin), Coord(xmax, ymax)
-
-
-def draw(world, droid, target):
-    def pixel(coord):
-        if coord == droid:
-            return '\u001b[33;1m()\u001b[0m'
-        elif coord == target:
-            return '\u001b[31;1m()\u001b[0m'
-        elif coord not in world:  # unexplored
-            return '  '
-        elif world[coord] == Wall:
-            return '\u001b[30;1m░░\u001b[0m'
-        elif world[coord] == Open:
-            return '\u001b[34m██\u001b[0m'
-        elif world[coord] == Oxygen:
-            return '\u001b[34;1m██\u001b[0m'
-        else:
-            raise NotImplementedError()
-
-    (xmin, ymin), (xmax, ymax) = bbox(
-        list(world.keys()) + [droid, target, (-10, -10), (10, 10)])
-    for y in range(ymin, ymax + 1):
-        for x in range(xmin, xmax + 1):
-            print(pixel((x, y)), end='')
-        print()
-    print()
-    sys.stdout.flush()
+PIXELS = {
+    Wall: style('░░', '30;1'),
+    Open: style('██', '34'),
+    Oxygen: style('██', '34;1'),
+}
+
+
+def draw(world, droid, target, box, screen):
+    overlay = {droid: style('()', '33;1')}
+    if target is not None:
+        overlay[target] = style('()', '31;1')
+    screen.show(rows(world, PIXELS, box, overlay, missing='  '))
 
 
 def neighbors(pos):
@@ -56,8 +32,18 @@ def neighbors(pos):
     }
 
 
-class FoundTarget(Exception):
-    pass
+def expand(_, task):
+    """Try moving the droid in 'task' in each of the given directions.
+
+    Return [(direction, status, droid after the move)].
+    """
+    droid, dirs = task
+    moves = []
+    for d in dirs:
+        child = droid.fork()
+        _, (status, ) = child.run_until_blocked([d])
+        moves.append((d, status, child))
+    return moves
 
 
 class Explorer:
@@ -66,61 +52,67 @@ class Explorer:
         self.droid = Coord(0, 0)
         self.target = None  # unknown
         self.world = {self.droid: Open}  # (x, y) -> Open/Wall/Oxygen
-        self.dir = None
-        self.breadcrumbs = []  # directions from start to current droid pos
+        self.came_from = {self.droid: None}  # pos -> (previous pos, dir)
+        self.bounds = Bounds([(-10, -10), (10, 10)])  # of world, at least
+        self.screen = None
 
     def draw(self, override=True):
         if self._draw or override:
-            draw(self.world, self.droid, self.target)
-            sleep(0.01)
-
-    def next_step(self):
-        self.draw(False)
-        self.backtrack = False  # explore
-        for d, pos in neighbors(self.droid).items():
-            if pos not in self.world:
-                self.dir = d
-                return self.dir
-
-        self.backtrack = True  # backtrack
-        opposite = {1: 2, 2: 1, 3: 4, 4: 3}
-        self.dir = opposite[self.breadcrumbs.pop()]
-        return self.dir
-
-    def next_result(self, status):
-        pos = neighbors(self.droid)[self.dir]
-        if status == 0:  # hit a wall
-            self.world[pos] = Wall
-        else:  # moved one step
-            self.world[pos] = Open
-            self.droid = pos
-            if not self.backtrack:
-                self.breadcrumbs.append(self.dir)
-            if status == 2 and self.target is None:  # found target
-                self.target = pos
-                raise FoundTarget(self.target)
-
-    def explore(self, program):
-        p = program.setup(inputs=self.next_step, outputs=self.next_result)
-        try:
-            p.run()  # explore to find target
-        except FoundTarget:
-            ret = self.target, self.breadcrumbs[:]
-        try:
-            p.run()  # explore the rest of the maze
-        except IndexError:  # done
-            pass
-        return ret
+            if self.screen is None:
+                self.screen = Screen(fps=100)
+            draw(self.world, self.droid, self.target, self.bounds.box(),
+                 self.screen)
+
+    def path(self, pos):
+        """Return the directions from the start to 'pos'."""
+        dirs = []
+        while self.came_from[pos] is not None:
+            pos, d = self.came_from[pos]
+            dirs.append(d)
+        return dirs[::-1]
+
+    def explore(self, program, workers=1):
+        """Map the whole maze by BFS, forking the droid at each open cell.
+
+        Return (target, directions to it). The frontier of each BFS level
+        is expanded by 'workers' processes (see intcode_pool).
+        """
+        frontier = [(program.fork(), self.droid)]
+        with Pool(None, workers) as pool:
+            while frontier:
+                tasks = [(droid, [d for d, n in neighbors(pos).items()
+                                  if n not in self.world])
+                         for droid, pos in frontier]
+                results = pool.map(expand, tasks)
+                next_frontier = []
+                for (_, pos), moves in zip(frontier, results):
+                    for d, status, droid in moves:
+                        new = neighbors(pos)[d]
+                        if new in self.world:  # reached from elsewhere
+                            continue
+                        self.bounds.add(new)
+                        if status == 0:  # hit a wall
+                            self.world[new] = Wall
+                            continue
+                        self.world[new] = Open
+                        self.came_from[new] = (pos, d)
+                        next_frontier.append((droid, new))
+                        if status == 2:
+                            self.target = new
+                frontier = next_frontier
+                if frontier:
+                    self.droid = frontier[-1][1]
+                self.draw(False)
+        return self.target, self.path(self.target)
 
     def spread_oxygen(self):
         self.world[self.target] = Oxygen  # start spreading from self.target
-        oxygenated = {self.target}
+        spread = {self.target}
         remaining = {pos for pos, state in self.world.items() if state == Open}
         steps = 0
         while remaining:
-            adjacent = chain(*[neighbors(pos).values() for pos in oxygenated])
+            adjacent = chain(*[neighbors(pos).values() for pos in spread])
             spread = remaining.intersection(adjacent)
-            oxygenated |= spread
             remaining -= spread
             for pos in spread:
                 self.world[pos] = Oxygen
@@ -1,7 +1,8 @@
 import itertools
 from typing import NamedTuple
 
-from intcode import IntCode
+from intcode import Channel, IntCode
+from render import bbox, rows
 
 
 class Coord(NamedTuple):
@@ -42,45 +43,28 @@ class ASCII:
         self.program = program
         self.scaffold = set()
         self.robot = (None, None)  # (position, direction)
-        self.pos = Coord(0, 0)
 
-        self.program.setup(outputs=self._buildmap).run()
+        camera = self.program.setup(outputs=Channel()).run()
+        self._buildmap(camera.outputs.read_lines())
 
-    def _drawmap(self, c):
-        print(chr(c), end='')
-
-    def _buildmap(self, c):
-        c = chr(c)
-        assert c in set('.#\n^>v<X')
-
-        # Find robot:
-        if c in set('^>v<X'):
-            direction = {'^': Up, '>': Right, 'v': Down, '<': Left, 'X': None}
-            self.robot = (self.pos, direction[c])
-
-        # Update scaffold:
-        if c in set('#^>v<'):
-            self.scaffold.add(self.pos)
-
-        # Update pos:
-        if c == '\n':
-            self.pos = Coord(0, self.pos.y + 1)
-        else:
-            self.pos += Right
+    def _buildmap(self, lines):
+        direction = {'^': Up, '>': Right, 'v': Down, '<': Left, 'X': None}
+        for y, line in enumerate(lines):
+            for x, c in enumerate(line):
+                assert c in set('.#^>v<X')
+                if c in direction:  # Found robot
+                    self.robot = (Coord(x, y), direction[c])
+                if c in set('#^>v<'):
+                    self.scaffold.add(Coord(x, y))
 
     def draw(self):
-        for y in range(max(pos.y for pos in self.scaffold) + 1):
-            for x in range(max(pos.x for pos in self.scaffold) + 1):
-                pos = Coord(x, y)
-                if pos == self.robot[0]:
-                    dir = self.robot[1]
-                    c = {Up: '^', Right: '>', Down: 'v', Left: '<'}[dir]
-                    print(c, end='')
-                elif pos in self.scaffold:
-                    print('#', end='')
-                else:
-                    print(' ', end='')
-            print()
+        pos, dir = self.robot
+        overlay = {}
+        if pos is not None and dir is not None:
+            overlay[pos] = {Up: '^', Right: '>', Down: 'v', Left: '<'}[dir]
+        box = (0, 0), bbox(self.scaffold)[1]
+        print('\n'.join(rows(self.scaffold, {True: '#', False: ' '}, box,
+                             overlay)))
 
     def find_neighbors(self, pos):
         return set(adjacents(pos)) & self.scaffold
@@ -117,9 +101,8 @@ class ASCII:
 
     def execute(self, plan):
         lines = plan + ['n']
-        output = []
-        self.program.setup(ascii=lines, outputs=output, mem={0: 2}).run()
-        return output.pop()
+        robot = self.program.setup(ascii=lines, outputs=[], mem={0: 2}).run()
+        return robot.outputs.pop()
 
 
 def find_repeated_prefixes(s):
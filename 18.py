@@ -3,6 +3,8 @@ from itertools import combinations
 from string import ascii_lowercase, ascii_uppercase
 from typing import Dict, NamedTuple, Set
 
+from render import bbox, rows
+
 
 class Coord(NamedTuple):
     x: int
@@ -38,6 +40,7 @@ class Vault:
         self.keys = keys
         self.doors = doors
         self._paths = None
+        self._bbox = None
 
     @staticmethod
     def world(f):
@@ -62,32 +65,19 @@ class Vault:
         return cls(spaces, entrances, keys, doors)
 
     def bbox(self):
-        xmin = min(p.x for p in self.spaces)
-        ymin = min(p.y for p in self.spaces)
-        xmax = max(p.x for p in self.spaces)
-        ymax = max(p.y for p in self.spaces)
-        return Coord(xmin, ymin), Coord(xmax, ymax)
+        if self._bbox is None:
+            lo, hi = bbox(self.spaces)
+            self._bbox = Coord(*lo), Coord(*hi)
+        return self._bbox
 
     def draw(self):
-        topleft, botright = self.bbox()
-        for y in range(topleft.y - 1, botright.y + 2):
-            for x in range(topleft.x - 1, botright.x + 2):
-                pos = Coord(x, y)
-                if pos in self.entrances:
-                    pixel = '@'
-                elif pos not in self.spaces:
-                    pixel = '█'
-                else:
-                    objects = [k for k, p in self.keys.items() if p == pos]
-                    objects += [
-                        k.upper() for k, p in self.doors.items() if p == pos
-                    ]
-                    if len(objects):
-                        pixel = objects.pop()
-                    else:
-                        pixel = ' '
-                print(pixel * 2, end='')
-            print()
+        overlay = {pos: '@@' for pos in self.entrances}
+        overlay.update((pos, k * 2) for k, pos in self.keys.items())
+        overlay.update((pos, k.upper() * 2) for k, pos in self.doors.items())
+        (x0, y0), (x1, y1) = self.bbox()
+        box = (x0 - 1, y0 - 1), (x1 + 1, y1 + 1)
+        print('\n'.join(rows(self.spaces, {True: '  ', False: '██'}, box,
+                             overlay)))
 
     def calculate_all_paths(self):
         adjacent = {}  # map pos -> set(adjacent pos)
@@ -1,13 +1,18 @@
-from functools import partial
-from itertools import product
+from collections import OrderedDict
 from typing import NamedTuple
 
 from intcode import IntCode
+from intcode_cache import ResultCache
+from intcode_probe import probe_grid
+from render import bbox, rows, style
 
 with open('19.input') as f:
     program = IntCode.from_file(f)
+probes = ResultCache(program)  # the JIT does not pay off on short probes
 
-pulled = {}  # map (x, y) -> pulled
+EDGE_CACHE = 1024  # rows of beam edges kept by Beam
+SCAN_WIDTH = 10  # max. columns per row searched for the beam, over y
+SEED_ROW = 8  # rows up to this are scanned when nothing else is known
 
 
 class Coord(NamedTuple):
@@ -26,83 +31,102 @@ class Coord(NamedTuple):
 
 
 def tractor_beam(pos):
-    if pos not in pulled:
-        pulled[pos] = program.setup(list(pos), []).run().outputs.pop() == 1
-    return pulled[pos]
-
-
-def find_bbox(points):
-    xmin = min(p.x for p in points)
-    ymin = min(p.y for p in points)
-    xmax = max(p.x for p in points)
-    ymax = max(p.y for p in points)
-    return Coord(xmin, ymin), Coord(xmax, ymax)
-
-
-def draw(*highlights, bbox=None):
-    highlights = set(highlights)
-    topleft, botright = find_bbox(pulled.keys()) if bbox is None else bbox
-    for y in range(topleft.y, botright.y + 1):
-        for x in range(topleft.x, botright.x + 1):
-            pos = Coord(x, y)
-            if pos not in pulled:
-                pixel = ' '
-            elif pulled[pos]:
-                pixel = '█'
-            else:
-                pixel = '░'
-            if pos in highlights:
-                pixel = f'\u001b[33;1m{pixel}\u001b[0m'
-            print(pixel, end='')
-        print()
-
-
-def find_first(pos, adjust, pred):
-    """Binary search pos, and find where pred goes from False to True"""
-    lo = pos
-    while not pred(pos):
-        lo = pos
-        n = adjust(pos + pos)
-        pos = n
-    # pred goes from False to True between lo and pos, binary search:
-    hi = pos
-    while True:
-        pos = adjust(lo + (hi - lo) // 2)
-        if pos in {lo, hi}:
-            return hi
-        if pred(pos):
-            hi = pos
-        else:
-            lo = pos
+    return probes.run(pos).outputs[-1] == 1
+
+
+def draw(*highlights, box=None):
+    """Show the beam around 'highlights', or in part 1's area."""
+    pixels = {True: '█', False: '░'}
+    overlay = {pos: style(pixels[tractor_beam(pos)], '33;1')
+               for pos in highlights}
+    if box is None:
+        box = bbox(highlights) if highlights else ((0, 0), (49, 49))
+    print('\n'.join(rows(tractor_beam, pixels, box, overlay)))
 
 
-def probe(pos, delta):
-    """Return last pos in delta direction that is still within beam.
+class Beam:
+    """Left and right edges of the beam, row by row.
 
-    If pos if not within beam, return first pos in -delta direction that is
-    within beam.
+    The beam is a cone from the origin, so its edges are close to lines
+    through the origin. A row's edges are found by walking from estimates
+    scaled from the farthest row seen so far, which takes O(1) probes once
+    a few rows are known. Rows are cached in a bounded LRU.
     """
-    if tractor_beam(pos):
-        while tractor_beam(pos + delta):
-            pos += delta
-    else:
-        while not tractor_beam(pos - delta):
-            pos -= delta
-        pos -= delta
-    return pos
+
+    def __init__(self, pulled, size=EDGE_CACHE):
+        self.pulled = pulled  # Coord -> bool
+        self.rows = OrderedDict()  # y -> (left, right) or None if empty
+        self.size = size
+        self.far = None  # (y, left, right) of the farthest non-empty row
+
+    def edges(self, y):
+        """Return (left, right) x of the beam in row y, or None."""
+        if y in self.rows:
+            self.rows.move_to_end(y)
+            return self.rows[y]
+        found = self.rows[y] = self.find(y)
+        if len(self.rows) > self.size:
+            self.rows.popitem(last=False)
+        if found is not None and (self.far is None or y > self.far[0]):
+            self.far = (y, ) + found
+        return found
+
+    def find(self, y):
+        pulled = self.pulled
+        if self.far is None and y > SEED_ROW:
+            self.edges(y // 2)  # so the walks below have short to go
+        left = None
+        if self.far is not None:
+            k, left, right = self.far
+            left, right = left * y // k, -(-right * y // k)
+            if not pulled(Coord((left + right) // 2, y)):
+                left = None
+        if left is None:  # scan the row; the beam is not too wide
+            left = next((x for x in range(SCAN_WIDTH * (y + 1))
+                         if pulled(Coord(x, y))), None)
+            if left is None:
+                return None
+            right = left
+        if pulled(Coord(left, y)):
+            while left > 0 and pulled(Coord(left - 1, y)):
+                left -= 1
+        else:
+            while not pulled(Coord(left + 1, y)):
+                left += 1
+            left += 1
+        if pulled(Coord(right, y)):
+            while pulled(Coord(right + 1, y)):
+                right += 1
+        else:
+            while not pulled(Coord(right - 1, y)):
+                right -= 1
+            right -= 1
+        return left, right
 
 
-def adjust_bl(pos):
-    pos = probe(pos, Coord(-1, 0))
-    pos = probe(pos, Coord(0, 1))
-    return pos
+def fits(beam, square, y):
+    """Return True if a square with its bottom row at y fits in the beam."""
+    bottom, top = beam.edges(y), beam.edges(y + 1 - square)
+    return bottom is not None and top is not None and (
+        top[1] + 1 - bottom[0] >= square)
 
 
-def square_within(square, bl):
-    assert tractor_beam(bl)
-    result = tractor_beam(Coord(bl.x + square - 1, bl.y + 1 - square))
-    # draw(bl)
-    return result
+def find_square(beam, square):
+    """Return the bottom left corner of the first square within the beam.
+
+    Gallop over rows until a square fits, then binary search for the
+    first row where it does.
+    """
+    lo, hi = square - 1, square
+    while not fits(beam, square, hi):
+        lo, hi = hi, hi * 2
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if fits(beam, square, mid):
+            hi = mid
+        else:
+            lo = mid
+    return Coord(beam.edges(hi)[0], hi)
 
 
 def square_corners(square, bl):
@@ -114,16 +138,18 @@ def square_corners(square, bl):
     ]
 
 
-# part 1
-print(sum(tractor_beam(Coord(x, y)) for x, y in product(range(50), range(50))))
-
-# part 2
-square = 100
-bl = max(pos for pos, p in pulled.items() if p)
-bl = find_first(bl, adjust_bl, partial(square_within, square))
-tl, tr, bl, br = square_corners(square, bl)
-for corner in [tl, tr, bl, br]:
-    assert tractor_beam(corner)
-assert not (tractor_beam(bl + Coord(-1, 0)) and tractor_beam(bl + Coord(0, 1)))
-assert not (tractor_beam(tr + Coord(1, 0)) and tractor_beam(tr + Coord(0, -1)))
-print(tl.x * 10000 + tl.y)
+if __name__ == '__main__':  # not in workers started by 'spawn'
+    # part 1
+    print(probe_grid(program, 50, 50).count())
+
+    # part 2
+    square = 100
+    bl = find_square(Beam(tractor_beam), square)
+    tl, tr, bl, br = square_corners(square, bl)
+    for corner in [tl, tr, bl, br]:
+        assert tractor_beam(corner)
+    assert not (tractor_beam(bl + Coord(-1, 0))
+                and tractor_beam(bl + Coord(0, 1)))
+    assert not (tractor_beam(tr + Coord(1, 0))
+                and tractor_beam(tr + Coord(0, -1)))
+    print(tl.x * 10000 + tl.y)
@@ -1,19 +1,17 @@
-from intcode import IntCode
+from intcode import Channel, IntCode
 
 with open('21.input') as f:
     program = IntCode.from_file(f)
 
 
-def run_script(script):
-    def output(i, draw=False):
-        if i < 128:
-            if draw:
-                print(chr(i), end='')
-        else:
-            print(i)
-
+def run_script(script, draw=False):
     assert len(script) <= 15
-    program.setup(ascii=script, outputs=output).run()
+    droid = program.setup(ascii=script, outputs=Channel()).run()
+    damage = droid.outputs.pop() if droid.outputs[-1] >= 128 else None
+    if draw:
+        print(droid.outputs.read_text(), end='')
+    if damage is not None:
+        print(damage)
 
 
 # part 1
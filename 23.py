@@ -1,93 +1,43 @@
-from functools import partial
-import sys
-
 from intcode import IntCode
-
-with open('23.input') as f:
-    program = IntCode.from_file(f)
-
-
-class NeedInput(Exception):
-    def __init__(self, who):
-        self.who = who
-
-
-class HasOutput(Exception):
-    def __init__(self, src, dst, x, y):
-        self.src = src
-        self.dst = dst
-        self.x = x
-        self.y = y
-
-
-input_qs = [[i, -1] for i in range(50)]
+from intcode_network import PacketNetwork
 
 
-def on_input(who):
-    if not input_qs[who]:
-        raise NeedInput(who)
-    else:
-        return input_qs[who].pop(0)
+class NAT:
+    """The node at address 255 of the day 23 network.
 
+    Keeps the last packet sent to it, and sends that to address 0 whenever
+    the network is idle. Stops the network on sending the same y twice.
+    """
 
-output_qs = [[] for _ in range(50)]
+    def __init__(self):
+        self.packet = None
+        self.first_y = None  # y of the first packet received
+        self.last_y = None  # y of the last packet sent
 
+    def receive(self, network, x, y):
+        if self.first_y is None:
+            self.first_y = y
+        self.packet = x, y
 
-def on_output(who, what):
-    output_qs[who].append(what)
-    if len(output_qs[who]) == 3:
-        dst, x, y = output_qs[who]
-        output_qs[who] = []
-        raise HasOutput(who, dst, x, y)
-
-
-procs = [
-    program.setup(partial(on_input, i), partial(on_output, i))
-    for i in range(50)
-]
-
-print_next = True
-prev_x, prev_y = None, None
-
-
-def nat(x, y):
-    global print_next, prev_x, prev_y
-    if print_next:
-        print(y)
-        print_next = False
-    prev_x = x
-    prev_y = y
-
+    def on_idle(self, network):
+        assert self.packet is not None
+        x, y = self.packet
+        if y == self.last_y:
+            network.stop()
+        else:
+            network.send(0, [x, y, -1])
+            self.last_y = y
 
-last_y = None
 
+with open('23.input') as f:
+    program = IntCode.from_file(f)
 
-def nat_send():
-    global last_y
-    assert prev_x is not None and prev_y is not None
-    if prev_y == last_y:
-        print(prev_y)
-        sys.exit(0)
-    input_qs[0].extend([prev_x, prev_y])
-    last_y = prev_y
+network = PacketNetwork(program, 50)
+nat = network.plug(255, NAT())
+network.run()
 
+# part 1
+print(nat.first_y)
 
-i = 0
-idle = 0
-while True:
-    try:
-        procs[i].run()
-    except HasOutput as e:
-        idle = 0
-        assert e.src == i
-        if e.dst == 255:
-            nat(e.x, e.y)
-        else:
-            input_qs[e.dst].extend([e.x, e.y, -1])
-    except NeedInput as e:
-        idle += 1
-        assert e.who == i
-    i = (i + 1) % 50
-    if all(len(q) == 0 for q in input_qs):
-        nat_send()
-        idle = 0
+# part 2
+print(nat.last_y)
@@ -1,5 +1,7 @@
 from collections import namedtuple
 
+from render import rows
+
 Coord = namedtuple('Coord', ['x', 'y'])
 
 
@@ -110,20 +112,9 @@ def bbox(points):
     return topleft, botright
 
 
-def draw(world):
-    out = []
-    topleft, botright = bbox(world.keys())
-    for y in range(topleft.y, botright.y + 1):
-        for x in range(topleft.x, botright.x + 1):
-            pos = Coord(x, y)
-            if pos not in world:
-                out.append('?')
-            elif world[pos]:
-                out.append('#')
-            else:
-                out.append('.')
-        out.append('\n')
-    return ''.join(out)
+def draw(world, box=None):
+    lines = rows(world, {True: '#', False: '.'}, box, missing='?')
+    return '\n'.join(lines) + '\n'
 
 
 def draw2(worlds):
@@ -155,8 +146,9 @@ with open('24.input') as f:
 # part 1
 seen = set()
 part1 = world
-while draw(part1) not in seen:
-    seen.add(draw(part1))
+box = bbox(world)
+while draw(part1, box) not in seen:
+    seen.add(draw(part1, box))
     part1 = step(part1)
 print(biodiversity_rating(part1))
 
@@ -1,14 +1,188 @@
-from intcode import IntCode
+from collections import deque
+import re
+import sys
+from typing import NamedTuple, Tuple
 
-with open('25.input') as f:
-    program = IntCode.from_file(f)
+from intcode import (BudgetExceeded, Channel, IntCode, Status,
+                     convert_ascii_line, decode_ascii)
+from intcode_pool import pool_imap
 
+OPPOSITE = {'north': 'south', 'south': 'north', 'east': 'west', 'west': 'east'}
+CHECKPOINT = 'Security Checkpoint'
+MAX_STEPS = 10 ** 5  # per command; some items trap the droid in a loop
+GRAY_BITS = 4  # items walked by each worker; the rest fixed per worker
+
+
+class Room(NamedTuple):
+    name: str
+    doors: Tuple[str, ...]
+    items: Tuple[str, ...]
+
+
+def parse(text):
+    """Return the last Room described in 'text', or None."""
+    rooms = re.findall(r'^== (.+) ==$', text, re.MULTILINE)
+    if not rooms:
+        return None
+    last = text[text.rindex(f'== {rooms[-1]} =='):]
+
+    def listing(heading):
+        m = re.search(heading + r':\n((?:- .*\n)+)', last)
+        return tuple(line[2:] for line in m.group(1).splitlines()) if m else ()
+
+    return Room(rooms[-1], listing('Doors here lead'), listing('Items here'))
+
+
+def command(droid, line=None):
+    """Send command 'line' to 'droid', and return the text it prints.
+
+    Raise BudgetExceeded if the droid gets stuck, and EOFError if the game
+    is over.
+    """
+    inputs = () if line is None else convert_ascii_line(line)
+    status, outputs = droid.run_until_blocked(
+        inputs, jit=True, max_steps=MAX_STEPS)
+    text = decode_ascii(outputs)
+    if status is Status.HALTED:
+        raise EOFError(text)
+    return text
+
+
+def explore(program):
+    """Map the ship by BFS from the start, forking the droid at each room.
+
+    Return (rooms by name, {(room, door): next room}, name of first room).
+    """
+    droid = program.setup([], [])
+    start = parse(command(droid))
+    rooms, doors = {start.name: start}, {}
+    queue = deque([(droid, start)])
+    while queue:
+        droid, room = queue.popleft()
+        for door in room.doors:
+            if (room.name, door) in doors:
+                continue
+            child = droid.fork()
+            there = parse(command(child, door))
+            doors[room.name, door] = there.name
+            if there.name == room.name:  # pushed back by the pressure plate
+                continue
+            doors[there.name, OPPOSITE[door]] = room.name
+            if there.name not in rooms:
+                rooms[there.name] = there
+                queue.append((child, there))
+    return rooms, doors, start.name
+
+
+def is_safe(droid, room, item):
+    """Return True if taking 'item' lets the game go on as usual."""
+    droid = droid.fork()
+    try:
+        command(droid, f'take {item}')
+        return "can't move" not in command(droid, room.doors[0])
+    except (BudgetExceeded, EOFError):
+        return False
 
-def output(i):
-    if i < 128:
-        print(chr(i), end='')
-    else:
-        print(i)
 
+def path(doors, src, dst):
+    """Return the shortest list of doors leading from 'src' to 'dst'."""
+    prev, queue = {src: None}, deque([src])
+    while dst not in prev:
+        name = queue.popleft()
+        for (here, door), there in doors.items():
+            if here == name and there not in prev:
+                prev[there] = (name, door)
+                queue.append(there)
+    steps = []
+    while prev[dst] is not None:
+        dst, door = prev[dst]
+        steps.append(door)
+    return steps[::-1]
 
-program.setup(ascii=input, outputs=output).run()
+
+def collect(program, rooms, doors, start):
+    """Walk a droid around to take all safe items, then to the checkpoint.
+
+    Return (droid, items held, door to the pressure-sensitive floor).
+    """
+    droid = program.setup([], [])
+    command(droid)
+    here, items = start, []
+    todo = {name for name, room in rooms.items() if room.items}
+    while todo:
+        there = min(todo, key=lambda name: len(path(doors, here, name)))
+        todo.remove(there)
+        for door in path(doors, here, there):
+            command(droid, door)
+        here = there
+        for item in rooms[here].items:
+            if is_safe(droid, rooms[here], item):
+                command(droid, f'take {item}')
+                items.append(item)
+    for door in path(doors, here, CHECKPOINT):
+        command(droid, door)
+    floor, = [door for door in rooms[CHECKPOINT].doors
+              if doors[CHECKPOINT, door] == CHECKPOINT]
+    return droid, items, floor
+
+
+def gray_walk(droid, task):
+    """Try the subsets of items with 'fixed' held, walking the others.
+
+    Successive subsets differ by one item (as in a Gray code), so each try
+    takes a single take/drop command. Return the final text, or None.
+    """
+    items, fixed, walked, floor = task
+    droid = droid.fork()
+    for item in items:
+        if item not in fixed:
+            command(droid, f'drop {item}')
+    held = set(fixed)
+    for i in range(2 ** len(walked)):
+        if i:
+            item = walked[(i & -i).bit_length() - 1]  # flipped in gray(i)
+            command(droid, f'{"drop" if item in held else "take"} {item}')
+            held ^= {item}
+        try:
+            text = command(droid, floor)
+        except EOFError as e:  # let in; the game is over
+            return e.args[0]
+        if 'Alert!' not in text:
+            return text
+    return None
+
+
+def solve(program, workers=None):
+    rooms, doors, start = explore(program)
+    droid, items, floor = collect(program, rooms, doors, start)
+    droid = droid.fork()
+    droid.code = None  # compiled blocks can't be sent to the workers
+    walked, rest = items[:GRAY_BITS], items[GRAY_BITS:]
+    tasks = [(items, [item for b, item in enumerate(rest) if n >> b & 1],
+              walked, floor) for n in range(2 ** len(rest))]
+    for text in pool_imap(gray_walk, droid, tasks, workers):
+        if text is not None:
+            return text
+    raise ValueError('No combination of items passes the checkpoint')
+
+
+def play(program):
+    output = Channel()
+
+    def prompt():
+        print(output.read_text(), end='')
+        return input()
+
+    program.setup(ascii=prompt, outputs=output).run()
+    print(output.read_text(), end='')
+
+
+if __name__ == '__main__':  # not in workers started by 'spawn'
+    with open('25.input') as f:
+        program = IntCode.from_file(f)
+
+    if sys.argv[1:] == ['play']:
+        play(program)
+    else:
+        text = solve(program)
+        print(re.search(r'typing (\d+)', text).group(1))
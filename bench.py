@@ -0,0 +1,349 @@
+"""Benchmarks for the IntCode machinery.
+
+Usage: python3 bench.py [benchmark...]  (default: run all benchmarks)
+"""
+from itertools import product
+import io
+import os
+import sys
+import tempfile
+from time import perf_counter
+import tracemalloc
+
+from intcode import IntCode
+from intcode_cache import ResultCache
+from intcode_network import PacketNetwork
+from intcode_probe import probe_grid
+import intcode_ring
+from intcode_trace import TraceWriter
+
+
+def load(path):
+    with open(path) as f:
+        return IntCode.from_file(f)
+
+
+def timed(func, *args, repeat=3):
+    """Return (result, best wall time) of calling func(*args) repeatedly."""
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func(*args)
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+
+def report_ips(name, steps, secs):
+    print(f'{name}: {steps} instructions in {secs:.3f}s, '
+          f'{steps / secs:,.0f} instructions/sec')
+
+
+def run_09(program, jit=False):
+    return program.setup(inputs=[2], outputs=[]).run(jit=jit).steps
+
+
+def run_19(program, jit=False):
+    steps = 0
+    for x, y in product(range(50), range(50)):
+        steps += program.setup(inputs=[x, y], outputs=[]).run(jit=jit).steps
+    return steps
+
+
+def run_02(program, jit=False):
+    steps = 0
+    for noun, verb in product(range(20), range(20)):
+        steps += program.setup(mem={1: noun, 2: verb}).run(jit=jit).steps
+    return steps
+
+
+def bench_interpreter():
+    report_ips('09 (BOOST, input 2)', *timed(run_09, load('09.input')))
+    report_ips('19 (50x50 beam probes)', *timed(run_19, load('19.input')))
+    report_ips('02 (20x20 patched runs)', *timed(run_02, load('02.input')))
+
+
+# Patch an instruction with each input: in [4]; add 0 + 0 -> [20] (patched
+# to add 0 + input); out [20]; jmp 0
+PATCH = [3, 4, 1101, 0, 0, 20, 4, 20, 1105, 1, 0, 99] + [0] * 10
+
+
+def check_jit():
+    """Check that the JIT sees instructions patched by input."""
+    for jit in [False, True]:
+        status, outputs = IntCode(PATCH).run_until_blocked([5, 7, 9], jit=jit)
+        assert outputs == [5, 7, 9], f'jit={jit} gave {outputs}'
+
+
+def bench_jit():
+    check_jit()
+    report_ips('09 (BOOST, input 2)',
+               *timed(run_09, load('09.input').compile(), True))
+    report_ips('19 (50x50 beam probes)',
+               *timed(run_19, load('19.input').compile(), True))
+    report_ips('02 (20x20 patched runs)',
+               *timed(run_02, load('02.input'), True))
+
+
+def scan_19(program):
+    return sum(program.setup(inputs=[x, y], outputs=[]).run().outputs[0]
+               for x, y in product(range(50), range(50)))
+
+
+def scan_19_batch(program):
+    batch = program.run_batch(list(product(range(50), range(50))))
+    return sum(out[0] for out in batch.outputs)
+
+
+def search_02(program, target=19690720):
+    for noun, verb in product(range(100), range(100)):
+        if program.setup(mem={1: noun, 2: verb}).run().memory[0] == target:
+            return 100 * noun + verb
+
+
+def search_02_batch(program, target=19690720):
+    grid = list(product(range(100), range(100)))
+    nouns, verbs = zip(*grid)
+    batch = program.run_batch(mem={1: nouns, 2: verbs})
+    noun, verb = grid[list(batch.memory[:, 0]).index(target)]
+    return 100 * noun + verb
+
+
+def bench_batch():
+    for name, func, path in [
+        ('19 part 1 (2500 probes), one by one', scan_19, '19.input'),
+        ('19 part 1 (2500 probes), batched', scan_19_batch, '19.input'),
+        ('02 part 2 (noun/verb search), one by one', search_02, '02.input'),
+        ('02 part 2 (10000 lanes), batched', search_02_batch, '02.input'),
+    ]:
+        result, secs = timed(func, load(path))
+        print(f'{name}: {result} in {secs * 1000:.1f}ms')
+
+
+# Echo inputs until given 0: in [100]; jz [100] 10; out [100]; jmp 0; halt
+ECHO = [3, 100, 1006, 100, 10, 4, 100, 1105, 1, 0, 99]
+
+
+def ping_pong(transport, n):
+    proc, in_q, out_q = IntCode(ECHO).start_in_subprocess(
+        transport=transport)
+    for i in range(1, n + 1):
+        in_q.put(i)
+        assert out_q.get() == i
+    in_q.put(0)
+    proc.join()
+    return in_q, out_q
+
+
+def stream(transport, n):
+    proc, in_q, out_q = IntCode(ECHO).start_in_subprocess(
+        transport=transport)
+    values = list(range(1, n + 1))
+    if transport == 'ring':
+        sent, received = 0, []
+        while len(received) < n:
+            sent += in_q.put_many(values[sent:], block=False)
+            received.extend(out_q.get_many())
+        in_q.put(0)
+    else:
+        for value in values:
+            in_q.put(value)
+        received = [out_q.get() for _ in range(n)]
+        in_q.put(0)
+    assert received == values
+    proc.join()
+    return in_q, out_q
+
+
+def bench_transport():
+    for name, func, n in [('ping-pong', ping_pong, 2000),
+                          ('stream', stream, 50000)]:
+        for transport in ['queue', 'ring']:
+            if transport == 'ring' and not intcode_ring.SUPPORTED:
+                print(f'{name} via ring: not supported on this machine')
+                continue
+            (in_q, out_q), secs = timed(func, transport, n, repeat=1)
+            if transport == 'ring':
+                in_q.unlink()
+                out_q.unlink()
+            print(f'{name} via {transport}: {n} values in {secs:.3f}s, '
+                  f'{n / secs:,.0f} values/sec')
+
+
+def traced(func, *args):
+    """Return (result, peak traced allocation in bytes) of func(*args)."""
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def far_writes(far):
+    # rb = far; for i in 0..9: [rb + i * 1000] = i; output [rb + 9000]; halt
+    memory = [109, far]
+    for i in range(10):
+        memory += [21101, i, 0, i * 1000]
+    memory += [204, 9000, 99]
+    return IntCode(memory).setup(inputs=[], outputs=[]).run().outputs
+
+
+def bench_memory():
+    for name, func, args in [
+        ('09 (BOOST, input 2)', run_09, [load('09.input')]),
+        ('far writes at 10**6', far_writes, [10**6]),
+        ('far writes at 10**7', far_writes, [10**7]),
+        ('far writes at 10**12', far_writes, [10**12]),
+    ]:
+        _, peak = traced(func, *args)
+        _, secs = timed(func, *args)
+        print(f'{name}: peak {peak / 1024:,.0f} KiB, {secs * 1000:.2f}ms')
+
+
+def scan_19_cached(cache):
+    return sum(cache.run([x, y]).outputs[0]
+               for x, y in product(range(50), range(50)))
+
+
+def load_program(path, cache):
+    with open(path) as f:
+        return IntCode.from_file(f, cache=cache)
+
+
+def bench_startup():
+    days = ['02', '05', '07', '09', '11', '13', '15', '17', '19', '21', '23',
+            '25']
+    total = {False: 0, True: 0}
+    for day in days:
+        path = f'{day}.input'
+        load_program(path, True)  # make sure the image exists
+        line = []
+        for cache in [False, True]:
+            _, secs = timed(load_program, path, cache, repeat=20)
+            total[cache] += secs
+            line.append(f'{secs * 1e6:,.0f}us')
+        print(f'{day}: parse text {line[0]}, load image {line[1]}')
+    print(f'all: parse text {total[False] * 1000:.2f}ms, '
+          f'load image {total[True] * 1000:.2f}ms')
+
+
+def run_traced(program, inputs, trace):
+    machine = program.setup(inputs, [])
+    if trace:
+        writer = TraceWriter(io.BytesIO())
+        writer.attach(machine)
+    machine.run()
+    if trace:
+        writer.close()
+    return machine.steps
+
+
+def bench_trace():
+    for name, program, inputs in [
+        ('09 (BOOST, input 2)', load('09.input'), [2]),
+        ('echo 20000 values', IntCode(ECHO), list(range(1, 20001)) + [0]),
+    ]:
+        secs = []
+        for trace in [False, True]:
+            steps, best = timed(run_traced, program, inputs, trace,
+                                repeat=10)
+            secs.append(best)
+        print(f'{name}: {secs[0] * 1000:.1f}ms, traced {secs[1] * 1000:.1f}ms '
+              f'({secs[1] / secs[0] - 1:+.1%})')
+
+
+def bench_cache():
+    program = load('19.input')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.sqlite')
+        memory = ResultCache(program)
+        for name, caches in [
+            ('cold', [memory, ResultCache(program, path)]),
+            ('warm', [memory, ResultCache(program, path)]),
+        ]:
+            for kind, cache in zip(['memory', 'disk'], caches):
+                result, secs = timed(scan_19_cached, cache, repeat=1)
+                cache.close()
+                print(f'19 part 1 (2500 probes), {name} {kind} cache: '
+                      f'{result} in {secs * 1000:.1f}ms')
+
+
+def ring_program(n):
+    """Return a day 23 style node forwarding packets (x, y) round a ring.
+
+    Node a sends (x - 1, y) on to node (a + 1) % n, or to node n once x is
+    0 (not 255, which is a node itself in larger rings).
+    """
+    a, x, y, d, t = 53, 54, 55, 56, 57  # variables
+    return IntCode([
+        3, a,  # 0: in [a]
+        3, x,  # 2: in [x]
+        1008, x, -1, t, 1005, t, 2,  # 4: back to 2 if [x] == -1
+        3, y,  # 11: in [y]
+        1006, x, 44,  # 13: jz [x] 44
+        1001, a, 1, d, 1007, d, n, t, 1005, t, 31, 1101, 0, 0, d,  # 16: [d]
+        1001, x, -1, x,  # 31: [x] -= 1
+        4, d, 4, x, 4, y, 1105, 1, 2,  # 35: out [d] [x] [y]; jmp 2
+        104, n, 4, x, 4, y, 1105, 1, 2,  # 44: out n [x] [y]; jmp 2
+        0, 0, 0, 0, 0])
+
+
+class Sink:
+    """Node counting the packets sent to it, stopping the network at n."""
+
+    def __init__(self, n):
+        self.n = n
+
+    def receive(self, network, x, y):
+        self.n -= 1
+        if self.n == 0:
+            network.stop()
+
+    def on_idle(self, network):
+        pass
+
+
+def ring_network(nodes, hops):
+    network = PacketNetwork(ring_program(nodes), nodes)
+    network.plug(nodes, Sink(nodes))
+    for i in range(nodes):
+        network.send(i, [hops, i, -1])
+    return network.run().packets
+
+
+def bench_network():
+    hops = 20
+    for nodes in [50, 500, 5000]:
+        packets, secs = timed(ring_network, nodes, hops, repeat=1)
+        print(f'{nodes} nodes, {hops} hops per packet: {packets} packets in '
+              f'{secs:.3f}s, {packets / secs:,.0f} packets/sec')
+
+
+def bench_probe():
+    program = load('19.input')
+    for workers in sorted({1, os.cpu_count() or 1}):
+        bitmap, secs = timed(probe_grid, program, 200, 200, 0, 0, workers,
+                             repeat=1)
+        print(f'19 probe grid (200x200), {workers} worker(s): '
+              f'{bitmap.count()} set, {40000 / secs:,.0f} probes/sec')
+
+
+BENCHMARKS = {
+    'interpreter': bench_interpreter,
+    'jit': bench_jit,
+    'memory': bench_memory,
+    'batch': bench_batch,
+    'transport': bench_transport,
+    'cache': bench_cache,
+    'startup': bench_startup,
+    'trace': bench_trace,
+    'probe': bench_probe,
+    'network': bench_network,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS.keys():
+        print(f'--- {name}:')
+        BENCHMARKS[name]()
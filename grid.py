@@ -0,0 +1,64 @@
+"""Compact 2-D grids of small integers, growing as needed."""
+
+
+class Grid:
+    """A 2-D grid of bytes stored row by row in a bytearray.
+
+    Coordinates may be negative. Cells never written read as 0, and writing
+    outside the allocated area grows it (at least doubling in the direction
+    of growth). The bounding box of all written cells is kept up to date.
+    """
+
+    def __init__(self, width=16, height=16, x0=0, y0=0):
+        self.x0, self.y0 = x0, y0  # coordinates of self.cells[0]
+        self.width, self.height = width, height
+        self.cells = bytearray(width * height)
+        self.lo = self.hi = None  # (x, y) corners of written cells
+
+    def __getitem__(self, pos):
+        x, y = pos[0] - self.x0, pos[1] - self.y0
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[y * self.width + x]
+        return 0
+
+    def __setitem__(self, pos, value):
+        x, y = pos
+        if self.lo is None:
+            self.lo = self.hi = (x, y)
+        elif not (self.lo[0] <= x <= self.hi[0]
+                  and self.lo[1] <= y <= self.hi[1]):
+            self.lo = min(self.lo[0], x), min(self.lo[1], y)
+            self.hi = max(self.hi[0], x), max(self.hi[1], y)
+        x, y = x - self.x0, y - self.y0
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            self.grow(pos)
+            x, y = pos[0] - self.x0, pos[1] - self.y0
+        self.cells[y * self.width + x] = value
+
+    def grow(self, pos):
+        x, y = pos
+        x0 = min(self.x0, x - (self.width if x < self.x0 else 0))
+        y0 = min(self.y0, y - (self.height if y < self.y0 else 0))
+        x1 = self.x0 + self.width
+        x1 = max(x1, x + 1 + (self.width if x >= x1 else 0))
+        y1 = self.y0 + self.height
+        y1 = max(y1, y + 1 + (self.height if y >= y1 else 0))
+        width, height = x1 - x0, y1 - y0
+        cells = bytearray(width * height)
+        for row in range(self.height):
+            src = row * self.width
+            dst = (row + self.y0 - y0) * width + self.x0 - x0
+            cells[dst:dst + self.width] = self.cells[src:src + self.width]
+        self.x0, self.y0, self.width, self.height = x0, y0, width, height
+        self.cells = cells
+
+    def bbox(self):
+        """Return corners (x, y) of the smallest box with all written cells."""
+        return self.lo, self.hi
+
+    def items(self):
+        """Yield ((x, y), value) for all non-zero cells."""
+        for i, value in enumerate(self.cells):
+            if value:
+                y, x = divmod(i, self.width)
+                yield (x + self.x0, y + self.y0), value
@@ -1,9 +1,49 @@
-from dataclasses import dataclass
-from functools import partial
-from itertools import chain
+from array import array
+from collections import deque
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from itertools import product
 from multiprocessing import Process, Queue
-from operator import add, eq, lt, mul, ne
-from typing import Callable, List, Optional
+from time import monotonic
+from typing import (Callable, Deque, Dict, List, MutableSequence, Optional,
+                    Set, Tuple)
+
+# Parameter kinds per op: 'i' is read (any mode), 'o' is written (mode 0/2)
+PARAMS = {1: 'iio', 2: 'iio', 3: 'o', 4: 'i', 5: 'ii', 6: 'ii', 7: 'iio',
+          8: 'iio', 9: 'i', 99: ''}
+
+
+def opcode_table():
+    """Map every valid opcode -> (op, mode1, mode2, mode3).
+
+    Mode digits for unused parameters are ignored.
+    """
+    table = {}
+    for op, params in PARAMS.items():
+        choices = [(0, 1, 2) if p == 'i' else (0, 2) for p in params]
+        choices += [range(10)] * (3 - len(params))
+        for modes in product(*choices):
+            opcode = op + sum(m * 10 ** (i + 2) for i, m in enumerate(modes))
+            modes = modes[:len(params)] + (0, ) * (3 - len(params))
+            table[opcode] = (op, ) + modes
+    return table
+
+
+OPCODES = opcode_table()
+
+# Memory is a dense list holding the program image (and whatever is stored
+# close to its end), plus sparse pages for addresses far beyond that.
+PAGE_SIZE = 1024  # cells per sparse page
+DENSE_GAP = 1 << 16  # max. distance past end of dense memory to extend it
+
+PROFILE = None  # default .profile for new machines (see intcode_profile)
+
+NO_LIMIT = 1 << 62  # step limit when running without budget
+CHECK_EVERY = 10000  # max. instructions between checks of a deadline
+
+
+def input_int():
+    return int(input('Input:').rstrip())
 
 
 def convert_ascii_line(line):
@@ -11,148 +51,482 @@ def convert_ascii_line(line):
     return [ord(c) for c in line + '\n']
 
 
+def decode_ascii(values):
+    return ''.join(chr(v) if 0 <= v < 128 else str(v) for v in values)
+
+
+class Channel(deque):
+    """A FIFO of values going into or coming out of a machine.
+
+    An input channel with a 'source' callable is refilled from it when
+    empty, either with one value per call, or with one line of text per
+    call if 'ascii' is set. Without a source, reading an empty channel
+    raises IndexError. An output channel collects values, unless a 'sink'
+    callable is given, which is then called for each value instead.
+    """
+
+    def __init__(self, values=(), source=None, sink=None, ascii=False):
+        super().__init__(values)
+        self.source, self.sink, self.ascii = source, sink, ascii
+
+    def read(self):
+        if not self:
+            if not self.ascii:
+                return self.source()  # may be None, pausing the machine
+            line = self.source()
+            if line is None:
+                return None
+            self.extend(convert_ascii_line(line))
+        return self.popleft()
+
+    def reader(self):
+        """Return the callable a machine should use to read from here."""
+        return self.popleft if self.source is None else self.read
+
+    def writer(self):
+        """Return the callable a machine should use to write to here."""
+        return self.append if self.sink is None else self.sink
+
+    def extend_lines(self, lines):
+        for line in lines:
+            self.extend(convert_ascii_line(line))
+
+    def drain(self):
+        """Remove and return all values."""
+        values = list(self)
+        self.clear()
+        return values
+
+    def read_text(self):
+        """Remove all values and return them as text.
+
+        Values beyond ASCII are rendered as decimal numbers.
+        """
+        return decode_ascii(self.drain())
+
+    def read_lines(self):
+        """Remove and return the complete lines of text (without newlines).
+
+        An incomplete last line is left in the channel.
+        """
+        values = self.drain()
+        end = len(values) - values[::-1].index(10) if 10 in values else 0
+        self.extend(values[end:])
+        return decode_ascii(values[:end]).split('\n')[:-1]
+
+
+class BudgetExceeded(Exception):
+    """Raised when a machine runs out of steps or time.
+
+    The machine is left in a consistent state; .run() resumes it.
+    """
+    outputs = None  # produced before the budget ran out (run_until_blocked)
+
+
+def step_limit(steps, max_steps):
+    return NO_LIMIT if max_steps is None else steps + max_steps
+
+
+def next_check(steps, limit, deadline):
+    """Check the budget, and return the step count to check it again at.
+
+    Interpreters call this when their step count reaches the last returned
+    value, but only at jumps (or other basic block boundaries) to keep the
+    overhead down. Any infinite loop must jump, so it is always caught.
+    """
+    if steps >= limit:
+        raise BudgetExceeded(f'Step budget used up at step {steps}')
+    if deadline is None:
+        return limit
+    if monotonic() >= deadline:
+        raise BudgetExceeded(f'Deadline passed at step {steps}')
+    return min(limit, steps + CHECK_EVERY)
+
+
+class Status(Enum):  # why .run_until_blocked() returned
+    NEEDS_INPUT = 'needs input'
+    HAS_OUTPUT = 'has output'
+    HALTED = 'halted'
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    memory: List[int]  # never written to; machines copy it before writing
+    pages: Dict[int, MutableSequence[int]]  # ditto
+    ip: int
+    rb: int
+    steps: int
+    pending: Tuple[int, ...]
+
+
 @dataclass
 class IntCode:
     memory: List[int]
     ip: int = 0  # instruction pointer
     rb: int = 0  # relative base
-    do_input: Callable[[], int] = lambda: int(input('Input:').rstrip())
+    steps: int = 0  # number of instructions executed
+    do_input: Callable[[], int] = input_int
     inputs: Optional[List[int]] = None
     do_output: Callable[[int], None] = print
     outputs: Optional[List[int]] = None
+    code: Optional[object] = None  # shared cache of compiled blocks
+    cow: bool = False  # memory is shared with others; copy before writing
+    pages: Dict[int, MutableSequence[int]] = field(default_factory=dict)
+    owned: Set[int] = field(default_factory=set)  # pages safe to write
+    pending: Deque[int] = field(default_factory=deque)  # see run_until_blocked
+    profile: Optional[object] = field(default_factory=lambda: PROFILE)
+    trace: Optional[object] = None  # intcode_trace.Stream; not forked
 
     @classmethod
-    def from_file(cls, f):
-        return cls(list(map(int, f.read().split(','))))
+    def from_file(cls, f, cache=True):
+        """Load program from a text file of comma-separated integers.
 
-    def _consume_ascii(self, get_ascii_line):
-        if not self.inputs:
-            self.inputs = convert_ascii_line(get_ascii_line())
-        return self.inputs.pop(0)
+        With 'cache', the parsed program is kept in a binary image file next
+        to the input, and loaded from there next time (see intcode_image).
+        """
+        if cache:
+            import intcode_image
+            return cls(intcode_image.load(f))
+        return cls(list(map(int, f.read().split(','))))
 
     def setup(self, inputs=None, outputs=None, mem=None, ascii=None):
-        memory = self.memory[:]
+        """Return a copy of this machine with new I/O and memory patches.
+
+        Input is taken from 'inputs' (values, or a callable returning one
+        value at a time), or from 'ascii' (lines of text, or a callable
+        returning one line at a time). Output goes to 'outputs' (values
+        collected in a list or Channel, or a callable taking each value).
+        Inputs are wrapped in a Channel (unless already one), as are output
+        callables, and these become .inputs/.outputs of the copy; an output
+        list is appended to, and becomes .outputs as is. Without them, I/O is
+        shared with this machine.
+        """
         if ascii is not None:  # Take lines of ASCII and convert to input
             assert inputs is None
             if callable(ascii):
-                inputs = []
-                do_input = partial(self._consume_ascii, ascii)
-            elif isinstance(ascii, list):
-                inputs = chain.from_iterable(
-                    convert_ascii_line(line) for line in ascii)
-                do_input = partial(next, inputs)
-        elif inputs is None:
+                inputs = Channel(source=ascii, ascii=True)
+            else:
+                inputs = Channel()
+                inputs.extend_lines(ascii)
+        if inputs is None:
             do_input = self.do_input
             inputs = self.inputs
         else:
-            if callable(inputs):
-                do_input = inputs
-                inputs = None
-            elif isinstance(inputs, list):
-                do_input = partial(inputs.pop, 0)
-            else:
-                raise NotImplementedError
+            if not isinstance(inputs, Channel):
+                if callable(inputs):
+                    inputs = Channel(source=inputs)
+                else:
+                    inputs = Channel(inputs)
+            do_input = inputs.reader()
         if outputs is None:
             do_output = self.do_output
             outputs = self.outputs
         else:
-            if callable(outputs):
-                do_output = outputs
-                outputs = None
-            elif isinstance(outputs, list):
-                do_output = outputs.append
+            if isinstance(outputs, Channel):
+                do_output = outputs.writer()
+            elif callable(outputs):
+                outputs = Channel(sink=outputs)
+                do_output = outputs.writer()
             else:
-                raise NotImplementedError
+                do_output = outputs.append
+        child = self.fork()
+        child.do_input, child.inputs = do_input, inputs
+        child.do_output, child.outputs = do_output, outputs
         if mem is not None:
+            if self.code is None:  # key compiled blocks by the unpatched image
+                import intcode_jit
+                self.code = child.code = intcode_jit.cache_for(self.memory)
             for addr, value in mem.items():
-                memory[addr] = value
-        return self.__class__(memory, self.ip, self.rb, do_input, inputs,
-                              do_output, outputs)
+                child.store(addr, value)
+                child.code.mark_mutable(addr)  # read it live, not baked in
+        return child
+
+    def fork(self):
+        """Return a copy of this machine, sharing memory until written.
+
+        I/O callbacks and channels are shared, not copied; use .setup() to
+        rewire them.
+        """
+        self.cow = True
+        return replace(self, pending=deque(self.pending), trace=None)
+
+    def snapshot(self):
+        self.cow = True
+        return Snapshot(self.memory, self.pages, self.ip, self.rb, self.steps,
+                        tuple(self.pending))
+
+    def restore(self, snapshot):
+        self.memory, self.pages = snapshot.memory, snapshot.pages
+        self.cow = True
+        self.ip, self.rb, self.steps = snapshot.ip, snapshot.rb, snapshot.steps
+        self.pending = deque(snapshot.pending)
+        return self
+
+    def own_memory(self):
+        """Make sure memory is not shared with anybody else.
 
-    @staticmethod
-    def decode(opcode):
-        modebits, op = divmod(opcode, 100)
-        return op, [int(digit) for digit in '{:03d}'.format(modebits)[::-1]]
+        Sparse pages are shared until they are written by .store().
+        """
+        if self.cow:
+            self.memory, self.cow = self.memory[:], False
+            self.pages, self.owned = dict(self.pages), set()
 
     def load(self, address):
-        if address >= len(self.memory):
-            return 0
-        return self.memory[address]
+        if address < len(self.memory):
+            return self.memory[address]
+        page = self.pages.get(address // PAGE_SIZE)
+        return 0 if page is None else page[address % PAGE_SIZE]
 
     def store(self, address, value):
-        if address >= len(self.memory):  # extend memory if needed
-            self.memory += [0] * (address + 1 - len(self.memory))
-        self.memory[address] = value
-
-    def resolve_args(self, nargs, nresults, modes):
-        assert nargs + nresults <= len(modes)
-        decoders = {
-            ('in', 0): lambda arg: self.load(arg),  # positional mode
-            ('in', 1): lambda arg: arg,  # immediate mode
-            ('in', 2): lambda arg: self.load(self.rb + arg),  # relative mode
-            ('out', 0): lambda arg: arg,  # absolute address
-            ('out', 2): lambda arg: self.rb + arg,  # address relative to RB
-        }
-        dirs = ['in'] * nargs + ['out'] * nresults
-        args = self.memory[self.ip + 1:self.ip + 1 + nargs + nresults]
-        return [decoders[(d, m)](arg) for d, m, arg in zip(dirs, modes, args)]
-
-    def arithmetic_op(self, func, param_modes):
-        a, b, result = self.resolve_args(2, 1, param_modes)
-        self.store(result, func(a, b))
-        self.ip += 4
-
-    def input_op(self, param_modes):
-        addr, = self.resolve_args(0, 1, param_modes)
-        self.store(addr, self.do_input())
-        self.ip += 2
-
-    def output_op(self, param_modes):
-        arg, = self.resolve_args(1, 0, param_modes)
-        # self.do_output() may throw; a subsequent .run() should not repeat it.
-        self.ip += 2  # increment IP _first_
-        self.do_output(arg)  # _then_ call .do_output()
-
-    def jump_op(self, predicate, param_modes):
-        condition, target = self.resolve_args(2, 0, param_modes)
-        self.ip = target if predicate(condition) else self.ip + 3
-
-    def test_op(self, predicate, param_modes):
-        a, b, result = self.resolve_args(2, 1, param_modes)
-        self.store(result, 1 if predicate(a, b) else 0)
-        self.ip += 4
-
-    def adjust_rb_op(self, param_modes):
-        a, = self.resolve_args(1, 0, param_modes)
-        self.rb += a
-        self.ip += 2
-
-    @staticmethod
-    def halt_op(param_modes):
-        raise StopIteration
-
-    def run(self):
-        ops = {
-            1: partial(self.arithmetic_op, add),
-            2: partial(self.arithmetic_op, mul),
-            3: self.input_op,
-            4: self.output_op,
-            5: partial(self.jump_op, partial(ne, 0)),
-            6: partial(self.jump_op, partial(eq, 0)),
-            7: partial(self.test_op, lt),
-            8: partial(self.test_op, eq),
-            9: self.adjust_rb_op,
-            99: self.halt_op,
-        }
+        self.own_memory()
+        if address < len(self.memory):
+            self.memory[address] = value
+        elif address < len(self.memory) + DENSE_GAP:
+            self.extend(address + 1)
+            self.memory[address] = value
+        else:
+            self.store_sparse(address, value)
+
+    def extend(self, size):
+        """Grow dense memory in place, absorbing overlapping sparse pages."""
+        start = len(self.memory)
+        self.memory.extend([0] * (size - start))
+        for n in range(start // PAGE_SIZE, (size - 1) // PAGE_SIZE + 1):
+            page = self.pages.get(n)
+            if page is None:
+                continue
+            lo, hi = max(start, n * PAGE_SIZE), min(size, (n + 1) * PAGE_SIZE)
+            self.memory[lo:hi] = page[lo - n * PAGE_SIZE:hi - n * PAGE_SIZE]
+            if hi == (n + 1) * PAGE_SIZE:  # page entirely absorbed
+                del self.pages[n]
+
+    def store_sparse(self, address, value):
+        n, i = divmod(address, PAGE_SIZE)
+        page = self.pages.get(n)
+        if page is None:
+            page = self.pages[n] = array('q', bytes(8 * PAGE_SIZE))
+            self.owned.add(n)
+        elif n not in self.owned:  # copy shared page before writing to it
+            page = self.pages[n] = page[:]
+            self.owned.add(n)
+        try:
+            page[i] = value
+        except OverflowError:  # fall back to a list of Python ints
+            page = self.pages[n] = page.tolist()
+            page[i] = value
+
+    def compile(self):
+        """Compile the program reachable from IP into Python functions.
+
+        The compiled blocks are shared with machines created by .setup(), and
+        are used by .run(jit=True).
+        """
+        import intcode_jit
+        if self.code is None:
+            self.code = intcode_jit.cache_for(self.memory)
+        self.code.compile_reachable(self.memory, self.ip)
+        return self
+
+    def run(self, jit=False, max_steps=None, deadline=None):
+        """Run until halted, or paused by an I/O callback.
+
+        .do_input() may return None to pause before the input instruction,
+        and .do_output() may return True to pause after the output. A
+        subsequent .run() resumes the machine.
+
+        BudgetExceeded is raised (soon) after executing more than max_steps
+        instructions, or after time.monotonic() passes the deadline. The
+        machine can then be resumed with another .run().
+
+        If .profile is set (to an intcode_profile.Profile), the machine is
+        run by the profiling interpreter instead, even if jit is given.
+        """
+        return self.execute(self.do_input, self.do_output, jit, max_steps,
+                            deadline)
+
+    def run_until_blocked(self, inputs=(), max_outputs=None, jit=False,
+                          max_steps=None, deadline=None):
+        """Run until input is needed but not available, or until halted.
+
+        The given inputs are appended to .pending, which is where inputs are
+        taken from. Return (Status, list of outputs produced). If max_outputs
+        is given, return with Status.HAS_OUTPUT after that many outputs.
+
+        The budget is as for .run(); a BudgetExceeded raised here carries the
+        outputs produced so far in its .outputs.
+        """
+        pending = self.pending
+        pending.extend(inputs)
+        outputs = []
+
+        def do_input():
+            return pending.popleft() if pending else None
+
+        def do_output(value):
+            outputs.append(value)
+            return len(outputs) == max_outputs
+
+        try:
+            self.execute(do_input, do_output, jit, max_steps, deadline)
+        except BudgetExceeded as e:
+            e.outputs = outputs
+            raise
+        if len(outputs) == max_outputs:
+            return Status.HAS_OUTPUT, outputs
+        elif OPCODES[self.memory[self.ip]][0] == 99:
+            return Status.HALTED, outputs
+        return Status.NEEDS_INPUT, outputs
+
+    def coroutine(self, jit=False):
+        """Drive the machine as a generator.
+
+        Yields each output value, and None when the machine needs input.
+        Values passed to .send() are queued as inputs.
+        """
+        while True:
+            status, outputs = self.run_until_blocked(max_outputs=1, jit=jit)
+            if outputs:
+                value = yield outputs[0]
+            elif status is Status.NEEDS_INPUT:
+                value = yield None
+            else:  # halted
+                return
+            if value is not None:
+                self.pending.append(value)
+
+    def execute(self, do_input, do_output, jit=False, max_steps=None,
+                deadline=None):
+        self.own_memory()
+        limit = step_limit(self.steps, max_steps)
+        if self.trace is not None:
+            do_input = self.trace.recorder(self, do_input)
+        if self.profile is not None:
+            import intcode_profile
+            return intcode_profile.execute(self, do_input, do_output, limit,
+                                           deadline)
+        if jit:
+            import intcode_jit
+            if self.code is None:
+                self.code = intcode_jit.cache_for(self.memory)
+            return intcode_jit.execute(self, do_input, do_output, limit,
+                                       deadline)
+
+        # Hot loop: all state lives in locals, operands are fetched inline
+        # and opcodes are decoded through the precomputed OPCODES table.
+        # Memory must only ever be extended in place (see .store()), and
+        # is rebound after I/O callbacks, which may .snapshot() or .fork().
+        mem, load, store = self.memory, self.load, self.store
+        ip, rb, steps = self.ip, self.rb, self.steps
         try:
+            check_at = next_check(steps, limit, deadline)
             while True:
-                op, parameter_modes = self.decode(self.memory[self.ip])
-                ops[op](parameter_modes)
-        except StopIteration:
-            pass
+                op, m1, m2, m3 = OPCODES[mem[ip]]
+                if op == 99:
+                    break
+
+                a = mem[ip + 1]  # first parameter
+                if op == 3:  # input: a is the result address
+                    if m1:
+                        a += rb
+                    # do_input() may throw or pause; .run() then repeats it.
+                    # It may also look at .steps (see intcode_trace).
+                    self.steps = steps
+                    value = do_input()
+                    if value is None:
+                        break
+                    store(a, value)
+                    mem = self.memory
+                    ip += 2
+                    steps += 1
+                    continue
+                if m1 == 0:
+                    a = mem[a] if a < len(mem) else load(a)
+                elif m1 == 2:
+                    a += rb
+                    a = mem[a] if a < len(mem) else load(a)
+
+                if op == 4:  # output
+                    # do_output() may throw or pause; a subsequent .run()
+                    # should not repeat it, so advance IP _first_.
+                    ip += 2
+                    steps += 1
+                    if do_output(a):
+                        break
+                    if self.cow:
+                        self.own_memory()
+                        mem = self.memory
+                    continue
+                if op == 9:  # adjust relative base
+                    rb += a
+                    ip += 2
+                    steps += 1
+                    continue
+
+                b = mem[ip + 2]  # second parameter
+                if m2 == 0:
+                    b = mem[b] if b < len(mem) else load(b)
+                elif m2 == 2:
+                    b += rb
+                    b = mem[b] if b < len(mem) else load(b)
+
+                if op == 5:  # jump-if-true
+                    ip = b if a else ip + 3
+                elif op == 6:  # jump-if-false
+                    ip = ip + 3 if a else b
+                else:  # arithmetic and comparisons, result in third param
+                    c = mem[ip + 3]
+                    if m3:
+                        c += rb
+                    if op == 1:
+                        a += b
+                    elif op == 2:
+                        a *= b
+                    elif op == 7:
+                        a = 1 if a < b else 0
+                    else:  # op == 8
+                        a = 1 if a == b else 0
+                    if c < len(mem):
+                        mem[c] = a
+                    else:
+                        store(c, a)
+                    ip += 4
+                    steps += 1
+                    continue
+                steps += 1
+                if steps >= check_at:  # budget is only checked at jumps
+                    check_at = next_check(steps, limit, deadline)
+        finally:
+            self.ip, self.rb, self.steps = ip, rb, steps
         return self
 
-    def start_in_subprocess(self, in_q=None, out_q=None):
+    def run_batch(self, inputs=None, mem=None):
+        """Run copies of this machine in lockstep, one per row of 'inputs'.
+
+        Returns an intcode_batch.Batch. Requires NumPy.
+        """
+        from intcode_batch import Batch
+        return Batch.setup(self, inputs, mem).run()
+
+    def start_in_subprocess(self, in_q=None, out_q=None, transport='queue'):
+        """Run a copy of this machine in a subprocess.
+
+        Input is taken from in_q and output is put in out_q. With
+        transport='ring', these are intcode_ring.RingBuffer objects (created
+        here unless given) instead of multiprocessing.Queue objects, and the
+        caller should .unlink() them when done. Rings only carry int64 values;
+        if the machine outputs anything else, out_q.get() raises EOFError.
+        Rings are only available on x86-64 (see intcode_ring).
+        """
+        if transport == 'ring':
+            from intcode_ring import RingBuffer, serve
+            if in_q is None:
+                in_q = RingBuffer()
+            if out_q is None:
+                out_q = RingBuffer()
+            proc = Process(target=serve, args=(self, in_q, out_q))
+            proc.start()
+            return proc, in_q, out_q
+
         if in_q is None:
             in_q = Queue()
         if out_q is None:
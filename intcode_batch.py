@@ -0,0 +1,150 @@
+"""Run many copies ("lanes") of one IntCode program in lockstep with NumPy.
+
+All lanes share one 2-D int64 memory array (one row per lane). On each round,
+the running lanes are grouped by (IP, opcode) and every group executes its
+instruction as one vectorized operation, so lanes that diverge simply end up
+in different groups. Lanes that halt, or run out of input, are masked out.
+
+Values must fit in int64; an OverflowError is raised when an arithmetic
+result might not.
+"""
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from intcode import OPCODES
+
+MAX_MEMORY = 1 << 20  # cells per lane
+INT64_MAX = float(np.iinfo(np.int64).max)
+
+
+@dataclass
+class Batch:
+    memory: np.ndarray  # (lanes, cells)
+    ip: np.ndarray  # (lanes, )
+    rb: np.ndarray
+    steps: np.ndarray
+    halted: np.ndarray  # (lanes, ) bool; running out of input is not halting
+    inputs: np.ndarray  # (lanes, inputs)
+    consumed: np.ndarray  # (lanes, ) number of inputs consumed
+    outputs: List[List[int]]  # per lane
+
+    @classmethod
+    def setup(cls, machine, inputs=None, mem=None):
+        """Make one lane per row of 'inputs', with 'mem' patches per lane.
+
+        'mem' maps addresses to sequences of per-lane values.
+        """
+        assert not machine.pages, 'sparse memory is not supported'
+        if inputs is not None:
+            inputs = np.asarray(inputs, dtype=np.int64)
+            lanes = len(inputs)
+        else:
+            lanes = len(next(iter(mem.values())))
+            inputs = np.zeros((lanes, 0), dtype=np.int64)
+        if inputs.ndim == 1:
+            inputs = inputs.reshape(lanes, 1)
+        memory = np.tile(np.array(machine.memory, dtype=np.int64), (lanes, 1))
+        for addr, values in (mem or {}).items():
+            memory[:, addr] = values
+        zeros = np.zeros(lanes, dtype=np.int64)
+        return cls(memory, zeros + machine.ip, zeros + machine.rb,
+                   zeros + machine.steps,
+                   np.zeros(lanes, dtype=bool), inputs, zeros.copy(),
+                   [[] for _ in range(lanes)])
+
+    def reserve(self, addrs):
+        """Make sure memory covers all the given addresses."""
+        if len(addrs) == 0:
+            return
+        lo, hi = addrs.min(), addrs.max()
+        if lo < 0:
+            raise IndexError(f'Negative address {lo}')
+        if hi >= self.memory.shape[1]:
+            if hi >= MAX_MEMORY:
+                raise IndexError(f'Address {hi} beyond batch memory')
+            grow = max(hi + 1, 2 * self.memory.shape[1])
+            self.memory = np.pad(
+                self.memory, ((0, 0), (0, grow - self.memory.shape[1])))
+
+    def read(self, lanes, address, mode):
+        p = self.memory[lanes, address]
+        if mode == 1:
+            return p
+        if mode == 2:
+            p = p + self.rb[lanes]
+        self.reserve(p)
+        return self.memory[lanes, p]
+
+    def target(self, lanes, address, mode):
+        p = self.memory[lanes, address]
+        if mode == 2:
+            p = p + self.rb[lanes]
+        self.reserve(p)
+        return p
+
+    def execute(self, lanes, ip, opcode):
+        op, m1, m2, m3 = OPCODES[opcode]
+        if op == 99:
+            self.halted[lanes] = True
+            return lanes
+        if op == 3:
+            c = self.target(lanes, ip + 1, m1)
+            has_input = self.consumed[lanes] < self.inputs.shape[1]
+            lanes, c = lanes[has_input], c[has_input]
+            self.memory[lanes, c] = self.inputs[lanes, self.consumed[lanes]]
+            self.consumed[lanes] += 1
+            self.ip[lanes] += 2
+            self.steps[lanes] += 1
+            return lanes[~has_input]
+        a = self.read(lanes, ip + 1, m1)
+        if op == 4:
+            for lane, value in zip(lanes.tolist(), a.tolist()):
+                self.outputs[lane].append(value)
+            self.ip[lanes] += 2
+        elif op == 9:
+            self.rb[lanes] += a
+            self.ip[lanes] += 2
+        else:
+            b = self.read(lanes, ip + 2, m2)
+            if op == 5:
+                self.ip[lanes] = np.where(a != 0, b, ip + 3)
+            elif op == 6:
+                self.ip[lanes] = np.where(a == 0, b, ip + 3)
+            else:
+                if op == 1:
+                    if np.any(np.abs(a.astype(float) + b) >= INT64_MAX):
+                        raise OverflowError(f'Addition at {ip}')
+                    result = a + b
+                elif op == 2:
+                    if np.any(np.abs(a.astype(float) * b) >= INT64_MAX):
+                        raise OverflowError(f'Multiplication at {ip}')
+                    result = a * b
+                elif op == 7:
+                    result = (a < b).astype(np.int64)
+                else:  # op == 8
+                    result = (a == b).astype(np.int64)
+                c = self.target(lanes, ip + 3, m3)
+                self.memory[lanes, c] = result
+                self.ip[lanes] += 4
+        self.steps[lanes] += 1
+        return lanes[:0]
+
+    def run(self):
+        """Run all lanes until they halt or need more input."""
+        running = np.flatnonzero(~self.halted)
+        while len(running):
+            ips = self.ip[running]
+            key = ips * MAX_MEMORY + self.memory[running, ips]
+            order = np.argsort(key, kind='stable')
+            running, key = running[order], key[order]
+            splits = np.flatnonzero(key[1:] != key[:-1]) + 1
+            stopped = []
+            for lanes in np.split(running, splits):
+                ip = int(self.ip[lanes[0]])
+                opcode = int(self.memory[lanes[0], ip])
+                stopped.append(self.execute(lanes, ip, opcode))
+            running = np.setdiff1d(running, np.concatenate(stopped),
+                                   assume_unique=True)
+        return self
@@ -0,0 +1,95 @@
+"""Cache the results of pure IntCode runs, in memory and optionally on disk.
+
+A pure run starts from a fixed program image, with some memory patched and
+a list of inputs, and runs until it halts. Its outputs (and whatever memory
+cells the caller wants to look at afterwards) are then a function of the
+(image, patches, inputs) triple, which is hashed to form the cache key.
+
+Recent results are kept in a bounded LRU in memory. If a path is given, or
+the INTCODE_CACHE environment variable names a file, results are also stored
+in an SQLite database there, so they survive across processes and reruns.
+"""
+import atexit
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+from typing import NamedTuple, Tuple
+
+
+class Result(NamedTuple):
+    outputs: Tuple[int, ...]
+    peek: Tuple[int, ...]  # memory at the requested addresses, after halting
+
+
+def digest(machine, pending=True):
+    """Return a hash of the machine's memory image and state."""
+    queued = tuple(machine.pending) if pending else ()
+    h = hashlib.sha256(repr((machine.ip, machine.rb, queued)).encode())
+    h.update(','.join(map(str, machine.memory)).encode())
+    for n in sorted(machine.pages):
+        h.update(f';{n}:'.encode())
+        h.update(','.join(map(str, machine.pages[n])).encode())
+    return h.digest()
+
+
+class ResultCache:
+    def __init__(self, program, path=None, size=1 << 16, jit=False):
+        self.program, self.jit = program, jit
+        self.image = digest(program)
+        self.lru = OrderedDict()  # map key -> Result, least recent first
+        self.size = size
+        self.hits = self.disk_hits = self.misses = 0
+        if path is None:
+            path = os.environ.get('INTCODE_CACHE')
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path)
+            self.db.execute('PRAGMA synchronous = OFF')
+            self.db.execute('CREATE TABLE IF NOT EXISTS results '
+                            '(key BLOB PRIMARY KEY, result TEXT)')
+            atexit.register(self.close)
+
+    def key(self, inputs, mem, peek):
+        h = hashlib.sha256(self.image)
+        h.update(repr((tuple(inputs), sorted((mem or {}).items()),
+                       tuple(peek))).encode())
+        return h.digest()
+
+    def run(self, inputs=(), mem=None, peek=()):
+        """Return Result of running the program with 'inputs' and 'mem'.
+
+        The program must halt without needing more input than given.
+        """
+        key = self.key(inputs, mem, peek)
+        result = self.lru.get(key)
+        if result is not None:
+            self.lru.move_to_end(key)
+            self.hits += 1
+            return result
+        if self.db is not None:
+            row = self.db.execute('SELECT result FROM results WHERE key = ?',
+                                  (key, )).fetchone()
+            if row is not None:
+                result = Result(*map(tuple, json.loads(row[0])))
+                self.disk_hits += 1
+        if result is None:
+            machine = self.program.setup(list(inputs), [], mem).run(self.jit)
+            result = Result(tuple(machine.outputs),
+                            tuple(machine.load(a) for a in peek))
+            self.misses += 1
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?)',
+                                (key, json.dumps(result)))
+        self.lru[key] = result
+        if len(self.lru) > self.size:
+            self.lru.popitem(last=False)
+        return result
+
+    def close(self):
+        """Write pending results to disk."""
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
@@ -0,0 +1,343 @@
+"""Static analysis of IntCode programs: control-flow graph and friends.
+
+Code is found by following control flow from the entry point, so data mixed
+in with the code is never decoded. Within each basic block, values written
+by instructions whose inputs are all constants (immediates, or cells written
+earlier in the block with constants) are folded, which turns jumps like
+'jnz 1 922' into unconditional ones.
+
+Jump targets read from memory cells that no instruction writes to (by
+absolute address) are assumed to be constant; this ignores writes relative
+to the base, which could in theory alias them. Targets in cells that are
+written anywhere are left unresolved, whatever the value written: values
+are not tracked across blocks or through the stack.
+
+Subroutines are recognized by the calling convention of the usual IntCode
+compiler: a call stores the return address (the address just after the
+jump) into a relative-base cell, then jumps to the subroutine entry; a
+return is an unconditional jump to an address read relative to the base.
+Other jumps to computed addresses are left unresolved ('indirect').
+
+Usage: python3 intcode_cfg.py PROGRAM [DOTFILE]
+"""
+from dataclasses import dataclass, field
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+from intcode import OPCODES, PARAMS, IntCode
+from intcode_profile import disassemble
+
+
+@dataclass(frozen=True)
+class Instruction:
+    addr: int
+    op: int
+    modes: Tuple[int, ...]
+    params: Tuple[int, ...]
+
+    @property
+    def end(self):
+        return self.addr + 1 + len(self.params)
+
+    def target(self):
+        """Return static address written by this instruction, if any."""
+        if 'o' in PARAMS[self.op] and self.modes[-1] == 0:
+            return self.params[-1]
+        return None
+
+
+@dataclass
+class Block:
+    start: int
+    end: int  # address after the last instruction
+    instructions: List[Instruction]
+    exit: str  # fall, jump, branch, call, return, indirect, halt or invalid
+    # (a call to a computed address has only its 'return-site' edge)
+    edges: List[Tuple[int, str]] = field(default_factory=list)  # (to, kind)
+    folded: Dict[int, int] = field(default_factory=dict)  # addr -> value
+
+
+def decode(memory, addr):
+    """Return Instruction at addr, or None if there is no valid one."""
+    if not 0 <= addr < len(memory):
+        return None
+    decoded = OPCODES.get(memory[addr])
+    if decoded is None:
+        return None
+    op, *modes = decoded
+    n = len(PARAMS[op])
+    if addr + n >= len(memory):
+        return None
+    return Instruction(addr, op, tuple(modes[:n]),
+                       tuple(memory[addr + 1:addr + 1 + n]))
+
+
+def walk(memory, start, leaders, written):
+    """Decode the basic block at 'start', folding constants as we go.
+
+    'written' holds the static addresses written by any known instruction.
+    """
+    known: Dict[int, int] = {}  # cell -> value written earlier in block
+    folded: Dict[int, int] = {}
+    instructions: List[Instruction] = []
+    edges: List[Tuple[int, str]] = []
+    addr = start
+
+    def value(instr, i):
+        mode, p = instr.modes[i], instr.params[i]
+        if mode == 1:
+            return p
+        if mode == 0:
+            return known.get(p)
+        return None
+
+    def jump_target(instr):
+        if instr.addr + 2 in written:  # the jump itself is patched
+            return None
+        dest = value(instr, 1)
+        p = instr.params[1]
+        if dest is None and instr.modes[1] == 0 and p not in written:
+            dest = memory[p] if 0 <= p < len(memory) else 0
+        return dest
+
+    while True:
+        instr = decode(memory, addr)
+        if instr is None:
+            return Block(start, addr, instructions, 'invalid', edges, folded)
+        instructions.append(instr)
+        op, addr = instr.op, instr.end
+        if op == 99:
+            return Block(start, addr, instructions, 'halt', edges, folded)
+        if op in {5, 6}:
+            cond, dest = value(instr, 0), jump_target(instr)
+            taken = None if cond is None else (cond != 0) == (op == 5)
+            if taken is not False:
+                if dest is not None:
+                    edges.append((dest, 'jump'))
+                elif instr.modes[1] == 2 and taken:
+                    return Block(start, addr, instructions, 'return', edges,
+                                 folded)
+            if taken is True:
+                exit = 'jump' if dest is not None else 'indirect'
+                prev = instructions[-2] if len(instructions) > 1 else None
+                if (prev and prev.op in {1, 2} and prev.modes[2] == 2
+                        and folded.get(prev.addr) == addr):
+                    exit = 'call'  # return address saved on the stack
+                    if dest is not None:
+                        edges[-1] = (dest, 'call')
+                    edges.append((addr, 'return-site'))
+                return Block(start, addr, instructions, exit, edges, folded)
+            edges.append((addr, 'next'))
+            exit = 'branch' if taken is None and dest is not None else (
+                'fall' if taken is False else 'indirect')
+            return Block(start, addr, instructions, exit, edges, folded)
+        if op in {1, 2, 7, 8}:
+            a, b = value(instr, 0), value(instr, 1)
+            result = None
+            if a is not None and b is not None:
+                result = {1: a + b, 2: a * b, 7: int(a < b),
+                          8: int(a == b)}[op]
+                folded[instr.addr] = result
+            dest = instr.target()
+            if dest is None:  # relative write may alias anything
+                known.clear()
+            elif result is None:
+                known.pop(dest, None)
+            else:
+                known[dest] = result
+        elif op == 3:
+            dest = instr.target()
+            if dest is None:
+                known.clear()
+            else:
+                known.pop(dest, None)
+        elif op == 9:
+            pass
+        if addr in leaders:
+            edges.append((addr, 'next'))
+            return Block(start, addr, instructions, 'fall', edges, folded)
+
+
+@dataclass
+class CFG:
+    memory: List[int]
+    blocks: Dict[int, Block]  # by start address
+    functions: Dict[int, Set[int]]  # entry -> starts of blocks in body
+    calls: Dict[int, Set[int]]  # entry -> return sites of calls to it
+    returns: Dict[int, Set[int]]  # block ending in return -> return sites
+
+    def successors(self, block):
+        """Yield (address, kind) of all blocks following 'block'."""
+        yield from block.edges
+        for site in self.returns.get(block.start, ()):
+            yield site, 'return'
+
+    def code_cells(self):
+        cells = set()
+        for block in self.blocks.values():
+            for instr in block.instructions:
+                cells.update(range(instr.addr, instr.end))
+        return cells
+
+    def data_regions(self):
+        """Return [(start, end)] of cells not part of any decoded code."""
+        code, regions, start = self.code_cells(), [], None
+        for addr in range(len(self.memory) + 1):
+            if addr < len(self.memory) and addr not in code:
+                if start is None:
+                    start = addr
+            elif start is not None:
+                regions.append((start, addr))
+                start = None
+        return regions
+
+    def self_modifying_writes(self):
+        """Return [(writer, target, 'opcode' or 'operand')] into code.
+
+        Only writes to static addresses (position mode) are found.
+        """
+        code = self.code_cells()
+        starts = {instr.addr for block in self.blocks.values()
+                  for instr in block.instructions}
+        found = []
+        for block in self.blocks.values():
+            for instr in block.instructions:
+                target = instr.target()
+                if target in code:
+                    kind = 'opcode' if target in starts else 'operand'
+                    found.append((instr.addr, target, kind))
+        return sorted(found)
+
+    def unresolved(self):
+        """Return starts of blocks ending in jumps we could not follow."""
+        def resolved(block):
+            if block.exit == 'call':
+                return any(kind == 'call' for _, kind in block.edges)
+            if block.exit == 'return':
+                return block.start in self.returns
+            return block.exit not in {'indirect', 'invalid'}
+
+        return sorted(start for start, block in self.blocks.items()
+                      if not resolved(block))
+
+    def is_pure(self):
+        """Return True if no input can follow an output.
+
+        Such programs compute a function of their inputs, and their runs
+        can be cached (see intcode_cache). Any unresolved jump makes this
+        False, as it may lead to code that was never found. So False only
+        means "not known to be pure": day 19, say, calls through a function
+        pointer passed on the stack, and through a jump whose target cell is
+        negated later on, and is not recognized. (Assuming that such calls
+        enter known subroutines would be wrong for day 25, whose output code
+        is only reached through a function pointer.)
+        """
+        if self.unresolved():
+            return False
+        seen, todo = set(), []
+        for block in self.blocks.values():
+            ops = [instr.op for instr in block.instructions]
+            if 4 in ops:
+                if 3 in ops[ops.index(4):]:
+                    return False
+                todo.extend(to for to, _ in self.successors(block))
+        while todo:
+            start = todo.pop()
+            if start in seen or start not in self.blocks:
+                continue
+            seen.add(start)
+            block = self.blocks[start]
+            if any(instr.op == 3 for instr in block.instructions):
+                return False
+            todo.extend(to for to, _ in self.successors(block))
+        return True
+
+    def to_dot(self):
+        """Return the graph in Graphviz DOT format."""
+        styles = {'call': 'color=blue', 'return': 'color=blue, style=dashed',
+                  'return-site': 'style=dotted', 'next': '', 'jump': ''}
+        lines = ['digraph intcode {',
+                 '  node [shape=box, fontname=monospace];']
+        for start, block in sorted(self.blocks.items()):
+            text = disassemble(self.memory, start=start, end=block.end)
+            label = ''.join(line.replace('"', '\\"') + '\\l' for line in text)
+            extra = ', penwidth=2' if start in self.functions else ''
+            lines.append(f'  b{start} [label="{label}"{extra}];')
+        for start, block in sorted(self.blocks.items()):
+            for to, kind in self.successors(block):
+                if to in self.blocks:
+                    style = styles[kind]
+                    lines.append(f'  b{start} -> b{to}'
+                                 + (f' [{style}]' if style else '') + ';')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+
+def analyze(memory, entries=(0, )):
+    """Return the CFG of the code reachable from 'entries'."""
+    written: Set[int] = set()
+    for _ in range(10):  # until the set of static writes is stable
+        leaders = set(entries)
+        while True:  # until splitting blocks at leaders finds no new ones
+            blocks = {s: walk(memory, s, leaders, written) for s in leaders}
+            found = {to for block in blocks.values() for to, _ in block.edges
+                     if decode(memory, to) is not None}
+            if found <= leaders:
+                break
+            leaders |= found
+        targets = {instr.target() for block in blocks.values()
+                   for instr in block.instructions} - {None}
+        if targets <= written:
+            break
+        written |= targets
+
+    calls: Dict[int, Set[int]] = {}
+    for block in blocks.values():
+        if block.exit == 'call' and block.edges[-2:-1]:
+            (entry, kind), (site, _) = block.edges[-2:]
+            if kind == 'call':
+                calls.setdefault(entry, set()).add(site)
+
+    functions, returns = {}, {}
+    for entry in calls:
+        body, todo = set(), [entry]
+        while todo:
+            start = todo.pop()
+            if start in body or start not in blocks:
+                continue
+            body.add(start)
+            todo.extend(to for to, kind in blocks[start].edges
+                        if kind != 'call')
+        functions[entry] = body
+        for start in body:
+            if blocks[start].exit == 'return':
+                returns.setdefault(start, set()).update(calls[entry])
+    return CFG(list(memory), blocks, functions, calls, returns)
+
+
+def summary(cfg):
+    code = cfg.code_cells()
+    lines = [f'{len(cfg.blocks)} basic blocks, {len(code)} code cells, '
+             f'{len(cfg.functions)} subroutines',
+             'data: ' + ', '.join(f'{a}-{b - 1}'
+                                  for a, b in cfg.data_regions()),
+             'self-modifying writes: ' + ', '.join(
+                 f'{w}->{t} ({kind})'
+                 for w, t, kind in cfg.self_modifying_writes()),
+             'unresolved jumps in blocks: ' + ', '.join(
+                 map(str, cfg.unresolved())),
+             f'pure (no input after output): {cfg.is_pure()}']
+    return '\n'.join(lines)
+
+
+def main(path, dot_path: Optional[str] = None):
+    with open(path) as f:
+        cfg = analyze(IntCode.from_file(f).memory)
+    print(summary(cfg))
+    if dot_path is not None:
+        with open(dot_path, 'w') as f:
+            f.write(cfg.to_dot())
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
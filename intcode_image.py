@@ -0,0 +1,78 @@
+"""Cache parsed IntCode programs in a binary file next to their input.
+
+The image file holds a header (identifying the input by its mtime, size and
+SHA-256), the program as packed native int64s, and a section with the
+decimal values of any cells that do not fit in an int64 (whose packed slots
+hold 0). Loading maps the file and unpacks the int64s straight from the
+mapping, without parsing any text.
+
+An image is used as is if the input's mtime and size still match. If not,
+the input is read and hashed, and the image is only reused (and its header
+updated) if the hash matches; otherwise a new image is written.
+"""
+import mmap
+import os
+import struct
+
+SUFFIX = '.icache'
+MAGIC = b'ICIMAGE1'
+HEADER = struct.Struct('=8sqqqq32s')  # magic, mtime, size, cells, big, hash
+INT64 = range(-1 << 63, 1 << 63)
+
+
+def parse(text):
+    return list(map(int, text.split(',')))
+
+
+def read_image(path):
+    """Return (header fields, memory) from an image file."""
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        magic, mtime, size, cells, big, digest = HEADER.unpack_from(m)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an IntCode image')
+        end = HEADER.size + 8 * cells
+        with memoryview(m)[HEADER.size:end] as raw, raw.cast('q') as view:
+            memory = view.tolist()
+        if big:
+            for item in m[end:].decode('ascii').split(','):
+                address, value = item.split(':')
+                memory[int(address)] = int(value)
+    return (mtime, size, digest), memory
+
+
+def write_image(path, stat, digest, memory):
+    big = {a: v for a, v in enumerate(memory) if v not in INT64}
+    packed = [0 if a in big else v for a, v in enumerate(memory)]
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size,
+                            len(memory), len(big), digest))
+        f.write(struct.pack(f'={len(packed)}q', *packed))
+        f.write(','.join(f'{a}:{v}' for a, v in big.items()).encode())
+    os.replace(tmp, path)
+
+
+def load(f):
+    """Return the program in the open text file 'f' as a list of ints."""
+    path = getattr(f, 'name', None)
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return parse(f.read())
+    image = path + SUFFIX
+    stat = os.stat(path)
+    try:
+        (mtime, size, digest), memory = read_image(image)
+        if (mtime, size) == (stat.st_mtime_ns, stat.st_size):
+            return memory
+    except (OSError, ValueError, struct.error):
+        digest = memory = None
+    import hashlib  # not needed on the fast path, and slow to import
+    text = f.read()
+    new_digest = hashlib.sha256(text.encode()).digest()
+    if new_digest != digest:
+        memory = parse(text)
+    try:
+        write_image(image, stat, new_digest, memory)
+    except OSError:  # e.g. read-only directory; just don't cache
+        pass
+    return memory
@@ -0,0 +1,264 @@
+"""Translate basic blocks of IntCode programs into Python functions.
+
+A block is a run of "pure" instructions (arithmetic, comparisons and relative
+base adjustments) optionally ended by a jump. Each block is turned into Python
+source, compiled with compile() and stored in a BlockCache shared by all
+machines running the same program image. Input, output and halt are left to
+the dispatcher in execute().
+
+Instruction words and parameters are baked into the generated code as
+constants, and each machine keeps the set of memory cells its blocks were
+baked from. A write into one of those cells invalidates the affected blocks.
+Parameter cells that the program has been seen to modify (the usual way of
+doing indirect addressing in IntCode) are marked as mutable in the cache, and
+read from memory at run time by blocks compiled after that.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Callable, Dict, FrozenSet, List, Set, Tuple
+
+from intcode import OPCODES, PARAMS, next_check
+
+BLOCK_OPS = {1, 2, 5, 6, 7, 8, 9}  # ops that are compiled into blocks
+MAX_BLOCK_LEN = 200  # instructions
+MAX_VARIANTS = 8  # compiled variants of a block kept per start address
+MAX_CACHES = 16  # program images whose blocks are kept
+
+CACHES = OrderedDict()  # map image hash -> BlockCache, least recent first
+
+
+@dataclass
+class Block:
+    start: int
+    func: Callable  # (mem, rb, load, store, code, invalidate) -> (ip, rb, n)
+    cells: FrozenSet[int]  # addresses whose contents were baked into func
+    ops: FrozenSet[int]  # addresses of the block's instructions
+    check: Callable  # itemgetter over cells
+    expect: Tuple  # check(memory) at compile time
+    successors: List[int]  # statically known addresses to continue at
+    source: str
+
+    def matches(self, mem):
+        try:
+            return self.check(mem) == self.expect
+        except IndexError:
+            return False
+
+
+@dataclass
+class BlockCache:
+    size: int  # length of the program image
+    mutable: Set[int] = field(default_factory=set)  # parameters read live
+    blocks: Dict[int, List[Block]] = field(default_factory=dict)
+
+    def lookup(self, mem, start):
+        for block in self.blocks.get(start, []):
+            if block.matches(mem):
+                return block
+        block = compile_block(mem, start, self.mutable, self.size)
+        variants = self.blocks.setdefault(start, [])
+        variants.insert(0, block)
+        del variants[MAX_VARIANTS:]
+        return block
+
+    def mark_mutable(self, address):
+        if address in self.mutable or not 0 <= address < self.size:
+            return
+        self.mutable.add(address)
+        for start, variants in self.blocks.items():
+            variants[:] = [b for b in variants if address not in b.cells]
+
+    def compile_reachable(self, mem, start):
+        """Compile all blocks statically reachable from 'start'."""
+        todo, seen = [start], set()
+        while todo:
+            ip = todo.pop()
+            if ip in seen or not 0 <= ip < len(mem):
+                continue
+            seen.add(ip)
+            entry = OPCODES.get(mem[ip])
+            if entry is None:
+                continue
+            op = entry[0]
+            if op in BLOCK_OPS:
+                todo.extend(self.lookup(mem, ip).successors)
+            elif op != 99:  # input/output
+                todo.append(ip + 1 + len(PARAMS[op]))
+
+
+def cache_for(memory):
+    key = hash(tuple(memory))
+    cache = CACHES.get(key)
+    if cache is None:
+        cache = CACHES[key] = BlockCache(len(memory))
+        if len(CACHES) > MAX_CACHES:
+            CACHES.popitem(last=False)
+    else:
+        CACHES.move_to_end(key)
+    return cache
+
+
+def compile_block(mem, start, mutable, image_size):
+    lines = []
+    cells, ops = set(), set()
+    successors = []
+    pc, count = start, 0
+
+    def read(cell, mode, tmp):
+        """Return expression for the parameter in 'cell'."""
+        if cell in mutable:
+            raw = f'mem[{cell}]'
+        else:
+            cells.add(cell)
+            raw = repr(mem[cell])
+            if mode == 0 and 0 <= mem[cell] < image_size:
+                return f'mem[{raw}]'
+        if mode == 1:
+            return raw
+        lines.append(f'{tmp} = {raw}' if mode == 0 else f'{tmp} = rb + {raw}')
+        return f'(mem[{tmp}] if {tmp} < size else load({tmp}))'
+
+    def write(cell, mode, expr, resume):
+        lines.append(f'v = {expr}')
+        if cell in mutable:
+            raw = f'mem[{cell}]'
+        else:
+            cells.add(cell)
+            raw = repr(mem[cell])
+        if cell not in mutable and mode == 0 and 0 <= mem[cell] < image_size:
+            lines.append(f'mem[{raw}] = v')
+            target = raw
+        else:
+            lines.append(f'c = rb + {raw}' if mode else f'c = {raw}')
+            lines.append('if c < size: mem[c] = v')
+            lines.append('else: store(c, v)')
+            target = 'c'
+        lines.append(f'if {target} in code:')
+        lines.append(f'    invalidate({target})')
+        lines.append(f'    return {resume}, rb, {count}')
+
+    while count < MAX_BLOCK_LEN:
+        entry = OPCODES.get(mem[pc]) if 0 <= pc < len(mem) else None
+        if entry is None or entry[0] not in BLOCK_OPS:
+            break
+        op, m1, m2, m3 = entry
+        nxt = pc + 1 + len(PARAMS[op])
+        if nxt > len(mem):
+            break
+        cells.add(pc)
+        ops.add(pc)
+        count += 1
+        lines.append(f'# {pc}: {mem[pc:nxt]}')
+        a = read(pc + 1, m1, 'a')
+        if op == 9:
+            lines.append(f'rb += {a}')
+        else:
+            b = read(pc + 2, m2, 'b')
+            if op in {5, 6}:
+                taken, not_taken = (b, nxt) if op == 5 else (nxt, b)
+                lines.append(f'return ({taken} if {a} else {not_taken}), '
+                             f'rb, {count}')
+                successors.append(nxt)
+                if m2 == 1 and pc + 2 not in mutable:
+                    successors.append(mem[pc + 2])
+                break
+            expr = {
+                1: f'{a} + {b}',
+                2: f'{a} * {b}',
+                7: f'1 if {a} < {b} else 0',
+                8: f'1 if {a} == {b} else 0',
+            }[op]
+            write(pc + 3, m3, expr, nxt)
+        pc = nxt
+    else:
+        successors.append(pc)
+        lines.append(f'return {pc}, rb, {count}')
+    if count == 0:
+        raise IndexError(f'No complete instruction at {start}')
+    if not successors:  # stopped before input/output/halt
+        successors.append(pc)
+        lines.append(f'return {pc}, rb, {count}')
+
+    # 'size' may go stale if store() grows memory, but only ever too small
+    name = f'block_{start}'
+    source = '\n'.join(
+        [f'def {name}(mem, rb, load, store, code, invalidate):',
+         '    size = len(mem)'] + [f'    {line}' for line in lines])
+    namespace = {}
+    exec(compile(source, f'<intcode block {start}>', 'exec'), namespace)
+    addrs = sorted(cells)
+    check = itemgetter(*addrs)
+    return Block(start, namespace[name], frozenset(addrs), frozenset(ops),
+                 check, check(mem), successors, source)
+
+
+def execute(machine, do_input, do_output, limit, deadline):
+    """Like IntCode.execute(), but running compiled blocks.
+
+    The budget is checked after each block.
+    """
+    cache = machine.code
+    mem, load, store = machine.memory, machine.load, machine.store
+    ip, rb, steps = machine.ip, machine.rb, machine.steps
+    blocks = {}  # map start address -> Block verified against mem
+    code = set()  # union of .cells of all blocks in 'blocks'
+
+    def invalidate(address):
+        for start, block in list(blocks.items()):
+            if address in block.cells:
+                del blocks[start]
+                if address not in block.ops:  # a parameter was modified
+                    cache.mark_mutable(address)
+        code.clear()
+        for block in blocks.values():
+            code.update(block.cells)
+
+    try:
+        check_at = next_check(steps, limit, deadline)
+        while True:
+            block = blocks.get(ip)
+            if block is not None:
+                ip, rb, n = block.func(mem, rb, load, store, code, invalidate)
+                steps += n
+                if steps >= check_at:
+                    check_at = next_check(steps, limit, deadline)
+                continue
+
+            op, m1, m2, m3 = OPCODES[mem[ip]]
+            if op in BLOCK_OPS:
+                block = cache.lookup(mem, ip)
+                blocks[ip] = block
+                code.update(block.cells)
+            elif op == 99:
+                break
+            elif op == 3:
+                a = mem[ip + 1]
+                if m1:
+                    a += rb
+                machine.steps = steps
+                value = do_input()
+                if value is None:
+                    break
+                store(a, value)
+                mem = machine.memory
+                if a in code:
+                    invalidate(a)
+                ip += 2
+                steps += 1
+            else:  # op == 4
+                a = mem[ip + 1]
+                if m1 == 0:
+                    a = load(a)
+                elif m1 == 2:
+                    a = load(rb + a)
+                ip += 2
+                steps += 1
+                if do_output(a):
+                    break
+                if machine.cow:
+                    machine.own_memory()
+                    mem = machine.memory
+    finally:
+        machine.ip, machine.rb, machine.steps = ip, rb, steps
+    return machine
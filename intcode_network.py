@@ -0,0 +1,142 @@
+"""Run a graph of IntCode machines cooperatively in a single process.
+
+Each machine reads its input from its own .pending deque. Whatever a machine
+outputs is handed (as a list of values) to its route: a callable that may in
+turn .send() values to other machines. The scheduler keeps a FIFO of machines
+that are ready to run, and runs each of them until it blocks on input or
+halts, so the order of execution is deterministic. With a time slice, a
+machine that runs for longer than that many instructions is preempted and
+put back at the end of the FIFO.
+
+PacketNetwork builds on this for day 23 style networks, where machines send
+each other packets (address, x, y), and other nodes (like a NAT) can be
+plugged in at addresses of their own.
+"""
+from collections import deque
+from functools import partial
+
+from intcode import BudgetExceeded, Status
+
+
+class Deadlock(Exception):
+    pass
+
+
+class Network:
+    def __init__(self, on_idle=None, time_slice=None):
+        self.machines = []
+        self.routes = []
+        self.halted = set()  # indexes of halted machines
+        self.ready = deque()  # indexes of machines ready to run
+        self.scheduled = set()  # same as in self.ready
+        # Called when no machine can make progress, but some have not
+        # halted. It may .send() more inputs; if it doesn't, run() raises
+        # Deadlock.
+        self.on_idle = on_idle
+        self.time_slice = time_slice  # max. instructions per step()
+        self.stopped = False
+
+    def add(self, machine, inputs=(), route=None):
+        """Add a machine to the network, and return its index."""
+        i = len(self.machines)
+        self.machines.append(machine)
+        self.routes.append(route)
+        self.schedule(i)
+        self.send(i, inputs)
+        return i
+
+    def connect(self, src, dst):
+        """Route outputs from machine 'src' to the input of machine 'dst'."""
+        self.routes[src] = partial(self.send, dst)
+
+    def stop(self):
+        """Make run() return after the current step."""
+        self.stopped = True
+
+    def schedule(self, i):
+        if i not in self.scheduled and i not in self.halted:
+            self.ready.append(i)
+            self.scheduled.add(i)
+
+    def send(self, dst, values):
+        if values:
+            self.machines[dst].pending.extend(values)
+            self.schedule(dst)
+
+    def step(self):
+        """Run the next ready machine until it blocks. Return its index."""
+        i = self.ready.popleft()
+        self.scheduled.remove(i)
+        try:
+            status, outputs = self.machines[i].run_until_blocked(
+                max_steps=self.time_slice)
+        except BudgetExceeded as e:  # preempted
+            status, outputs = None, e.outputs
+            self.schedule(i)
+        if status is Status.HALTED:
+            self.halted.add(i)
+        if outputs:
+            if self.routes[i] is None:
+                raise ValueError(f'Machine #{i} has nowhere to send output')
+            self.routes[i](outputs)
+        return i
+
+    def run(self):
+        """Run until all machines have halted, or until stopped."""
+        self.stopped = False
+        while len(self.halted) < len(self.machines) and not self.stopped:
+            if not self.ready:
+                if self.on_idle is not None:
+                    self.on_idle()
+                if self.stopped:
+                    break
+                if not self.ready:
+                    raise Deadlock(f'{len(self.machines)} machines, '
+                                   f'{len(self.halted)} halted, none ready')
+            self.step()
+        return self
+
+
+class PacketNetwork(Network):
+    """Machines sending each other packets of (address, x, y) outputs.
+
+    Machine i has address i, and is booted with it as its first input. Each
+    packet delivered to a machine is followed by a -1, so that it finds its
+    mailbox empty once it has read the packet, and then blocks until the
+    next one arrives. Packets to other addresses go to the node plugged in
+    there with .plug(), which must have these methods:
+      receive(network, x, y): handle a packet sent to the node
+      on_idle(network): called when all machines are blocked on input
+    """
+
+    def __init__(self, program, n, time_slice=None):
+        super().__init__(self.wake_up, time_slice)
+        self.nodes = {}  # map address -> node
+        self.partial = []  # per machine: outputs of an unfinished packet
+        self.packets = 0  # number of packets sent so far
+        for i in range(n):
+            self.partial.append([])
+            self.add(program.fork(), [i, -1], partial(self.route, i))
+
+    def plug(self, address, node):
+        self.nodes[address] = node
+        return node
+
+    def route(self, src, outputs):
+        values = self.partial[src]
+        values.extend(outputs)
+        end = len(values) - len(values) % 3
+        for dst, x, y in zip(*[iter(values[:end])] * 3):
+            self.packets += 1
+            node = self.nodes.get(dst)
+            if node is not None:
+                node.receive(self, x, y)
+            else:
+                self.send(dst, [x, y, -1])
+        del values[:end]
+
+    def wake_up(self):
+        for node in self.nodes.values():
+            node.on_idle(self)
+            if self.ready or self.stopped:
+                return
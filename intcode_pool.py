@@ -0,0 +1,82 @@
+"""Spread independent runs of one IntCode program across worker processes.
+
+Each worker process receives the program once, when it starts, so tasks
+only carry their own (small) arguments.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+program = None  # the program, in worker processes
+
+
+def init_worker(worker_program):
+    global program
+    program = worker_program
+
+
+def call(func, item):
+    return func(program, item)
+
+
+class Pool:
+    """Worker processes for running many batches of tasks on 'program'.
+
+    'func' given to the methods must be picklable (i.e. a module-level
+    function). With only one worker (the default on a single CPU), no
+    processes are started, and each item is only run when its result is
+    asked for.
+    """
+
+    def __init__(self, program, workers=None):
+        self.program = program
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.executor = None  # started on first use
+
+    def imap(self, func, items, chunksize=None):
+        """Yield func(program, item) for item in items, run in parallel."""
+        items = list(items)
+        if self.workers <= 1 or len(items) <= 1:
+            for item in items:
+                yield func(self.program, item)
+            return
+        if chunksize is None:
+            chunksize = max(1, len(items) // (4 * self.workers))
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                self.workers, initializer=init_worker,
+                initargs=(self.program, ))
+        yield from self.executor.map(call, [func] * len(items), items,
+                                     chunksize=chunksize)
+
+    def map(self, func, items, chunksize=None):
+        """Return [func(program, item) for item in items], run in parallel."""
+        return list(self.imap(func, items, chunksize))
+
+    def close(self):
+        """Stop the workers, cancelling tasks not yet started."""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def pool_imap(func, program, items, workers=None, chunksize=None):
+    """Yield func(program, item) for item in items, run in parallel.
+
+    Closing the iterator early cancels the items not yet started.
+    """
+    with Pool(program, workers) as pool:
+        yield from pool.imap(func, items, chunksize)
+
+
+def pool_map(func, program, items, workers=None, chunksize=None):
+    """Return [func(program, item) for item in items], run in parallel."""
+    with Pool(program, workers) as pool:
+        return pool.map(func, items, chunksize)
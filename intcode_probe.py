@@ -0,0 +1,89 @@
+"""Probe a rectangular grid with an IntCode program, across processes.
+
+A probe program (like day 19's) takes the two inputs x and y, and outputs 1
+or 0. probe_grid() runs it for every cell of a region, sharding the rows
+across a process pool where each worker holds its own copy of the program,
+and packs the results into a Bitmap.
+
+Usage: python3 intcode_probe.py PROGRAM WIDTH HEIGHT [WORKERS]
+"""
+from dataclasses import dataclass
+import sys
+from time import perf_counter
+
+from intcode import IntCode
+from intcode_pool import Pool
+
+
+@dataclass
+class Bitmap:
+    """A 2-D grid of bits, packed row by row into bytes.
+
+    Each row starts on a byte boundary, and holds column x in bit x % 8 of
+    its byte x // 8.
+    """
+    width: int
+    height: int
+    bits: bytes
+    x0: int = 0  # coordinates of the first cell
+    y0: int = 0
+
+    @property
+    def stride(self):
+        return (self.width + 7) // 8
+
+    def __getitem__(self, pos):
+        x, y = pos[0] - self.x0, pos[1] - self.y0
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        return bool(self.bits[y * self.stride + x // 8] >> x % 8 & 1)
+
+    def count(self):
+        """Return the number of set cells."""
+        return bin(int.from_bytes(self.bits, 'little')).count('1')
+
+    def row(self, y):
+        """Return the cells of row y as a list of bools."""
+        start = (y - self.y0) * self.stride
+        n = int.from_bytes(self.bits[start:start + self.stride], 'little')
+        return [bool(n >> x & 1) for x in range(self.width)]
+
+
+def probe_row(program, task):
+    """Return row y of the region as packed bits."""
+    x0, width, y, jit = task
+    n = 0
+    for x in range(width):
+        if program.setup([x0 + x, y], []).run(jit).outputs[-1] == 1:
+            n |= 1 << x
+    return n.to_bytes((width + 7) // 8, 'little')
+
+
+def probe_grid(program, width, height, x0=0, y0=0, workers=None, jit=True):
+    """Return a Bitmap of the cells in the region where 'program' says 1.
+
+    'workers' is as for intcode_pool.Pool; the rows are shared out between
+    them.
+    """
+    program = program.fork()
+    program.code = None  # compiled blocks can't be sent to the workers
+    tasks = [(x0, width, y, jit) for y in range(y0, y0 + height)]
+    with Pool(program, workers) as pool:
+        bits = b''.join(pool.imap(probe_row, tasks))
+    return Bitmap(width, height, bits, x0, y0)
+
+
+def main(path, width, height, workers=None):
+    with open(path) as f:
+        program = IntCode.from_file(f)
+    width, height = int(width), int(height)
+    start = perf_counter()
+    bitmap = probe_grid(program, width, height,
+                        workers=None if workers is None else int(workers))
+    secs = perf_counter() - start
+    print(f'{bitmap.count()} of {width}x{height} cells set, '
+          f'{width * height / secs:,.0f} probes/sec')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
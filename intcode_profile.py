@@ -0,0 +1,299 @@
+"""Opt-in profiling of IntCode machines.
+
+Set machine.profile = Profile() and that machine, along with every machine
+set up or forked from it afterwards, is run by an instrumented copy of the
+interpreter loop (see execute() below), counting into the shared Profile.
+Machines without a profile never touch this module.
+
+To profile a whole day, run it as 'python3 intcode_profile.py NN.py'. This
+prints a report when the day is done, comparing time spent in the IntCode
+interpreter, in its I/O callbacks, and in the rest of the script.
+"""
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+import json
+import runpy
+import sys
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import intcode
+from intcode import OPCODES, PARAMS, next_check
+
+NAMES = {1: 'add', 2: 'mul', 3: 'in', 4: 'out', 5: 'jnz', 6: 'jz', 7: 'lt',
+         8: 'eq', 9: 'arb', 99: 'halt'}
+MODES = ('position', 'immediate', 'relative')
+
+
+@dataclass
+class Profile:
+    runs: int = 0  # calls to the interpreter loop
+    steps: int = 0
+    seconds: float = 0.0  # spent in the interpreter loop, including I/O
+    io_seconds: float = 0.0  # spent in I/O callbacks
+    inputs: int = 0  # I/O callback calls
+    outputs: int = 0
+    high_water: int = -1  # highest address written
+    dense_cells: int = 0  # max. size of dense memory
+    sparse_pages: int = 0  # max. number of sparse pages
+    opcodes: Dict[int, int] = field(default_factory=Counter)  # raw opcodes
+    ips: Dict[int, int] = field(default_factory=Counter)
+    back_edges: Dict[Tuple[int, int], int] = field(default_factory=Counter)
+
+    def by_op(self):
+        """Return Counter of instructions executed, by mnemonic."""
+        counts = Counter()
+        for opcode, n in self.opcodes.items():
+            counts[NAMES[OPCODES[opcode][0]]] += n
+        return counts
+
+    def by_mode(self):
+        """Return Counter of parameters decoded, by addressing mode."""
+        counts = Counter()
+        for opcode, n in self.opcodes.items():
+            op, *modes = OPCODES[opcode]
+            for mode in modes[:len(PARAMS[op])]:
+                counts[MODES[mode]] += n
+        return counts
+
+    def hot_ips(self, n=10):
+        return self.ips.most_common(n)
+
+    def loops(self, n=None):
+        """Return [(start, end, iterations)] for the most taken back edges.
+
+        A loop is a jump from 'end' back to 'start' (<= end).
+        """
+        return [(dst, src, count)
+                for (src, dst), count in self.back_edges.most_common(n)]
+
+    def to_json(self, **kwargs):
+        d = asdict(self)
+        d['opcodes'] = {str(k): v for k, v in self.opcodes.items()}
+        d['ips'] = {str(k): v for k, v in self.ips.items()}
+        d['back_edges'] = [[src, dst, v]
+                           for (src, dst), v in self.back_edges.items()]
+        return json.dumps(d, **kwargs)
+
+    @classmethod
+    def from_json(cls, s):
+        d = json.loads(s)
+        d['opcodes'] = Counter({int(k): v for k, v in d['opcodes'].items()})
+        d['ips'] = Counter({int(k): v for k, v in d['ips'].items()})
+        d['back_edges'] = Counter(
+            {(src, dst): v for src, dst, v in d['back_edges']})
+        return cls(**d)
+
+    def report(self, wall_seconds=None):
+        """Return a human-readable summary.
+
+        If the total wall time of the profiled code is given, also show how
+        much of it was spent outside the interpreter.
+        """
+        vm = self.seconds - self.io_seconds
+        rate = self.steps / self.seconds if self.seconds else 0
+        lines = [f'{self.steps:,} instructions in {self.runs:,} runs, '
+                 f'{self.seconds:.3f}s, {rate:,.0f} instructions/sec',
+                 f'time: {vm:.3f}s interpreter, '
+                 f'{self.io_seconds:.3f}s I/O callbacks '
+                 f'({self.inputs:,} inputs, {self.outputs:,} outputs)']
+        if wall_seconds is not None:
+            outside = wall_seconds - self.seconds
+            lines.append(f'      {outside:.3f}s outside the machine; '
+                         f'{vm / wall_seconds:.0%} of {wall_seconds:.3f}s '
+                         f'is interpreter-bound')
+        lines.append(f'memory: {self.dense_cells:,} dense cells, '
+                     f'{self.sparse_pages} sparse pages, '
+                     f'highest write at {self.high_water}')
+        for title, counts in [('ops', self.by_op()),
+                              ('modes', self.by_mode())]:
+            total = sum(counts.values()) or 1
+            lines.append(f'{title}: ' + ', '.join(
+                f'{k} {v / total:.1%}' for k, v in counts.most_common()))
+        lines.append('hot IPs: ' + ', '.join(
+            f'{ip} ({n:,})' for ip, n in self.hot_ips()))
+        lines.append('hot loops: ' + ', '.join(
+            f'{start}-{end} ({n:,})' for start, end, n in self.loops(5)))
+        return '\n'.join(lines)
+
+
+def format_param(value, mode):
+    if mode == 1:
+        return str(value)
+    if mode == 2:
+        return f'[rb{value:+d}]'
+    return f'[{value}]'
+
+
+def disassemble(memory, profile=None, start=0, end=None, hot_loops=5):
+    """Return a listing of memory[start:end], one line per instruction.
+
+    Anything that does not decode as an instruction is listed as data. With
+    a profile, each line starts with its execution count, and the bodies of
+    the hottest loops are marked in the left margin.
+    """
+    end = len(memory) if end is None else min(end, len(memory))
+    loops: List[Tuple[int, int, int]] = []
+    if profile is not None:
+        loops = profile.loops(hot_loops)
+    lines = []
+    addr = start
+    while addr < end:
+        opcode = memory[addr]
+        decoded: Optional[tuple] = OPCODES.get(opcode)
+        if decoded is not None and addr + len(PARAMS[decoded[0]]) < end:
+            op, *modes = decoded
+            params = memory[addr + 1:addr + 1 + len(PARAMS[op])]
+            text = ' '.join([f'{NAMES[op]:4}'] + [
+                format_param(p, m) for p, m in zip(params, modes)])
+            size = 1 + len(params)
+        else:
+            text, size = f'data {opcode}', 1
+        if profile is not None:
+            margin = ''.join(chr(ord('a') + i) if lo <= addr <= hi else ' '
+                             for i, (lo, hi, _) in enumerate(loops))
+            for i, (lo, hi, n) in enumerate(loops):
+                if addr == lo:
+                    text += f'  ; loop {chr(ord("a") + i)}: {n:,} iterations'
+            text = f'{profile.ips.get(addr, 0):>10,} {margin} {text}'
+        lines.append(f'{addr:6}: {text}')
+        addr += size
+    return lines
+
+
+def execute(machine, do_input, do_output, limit, deadline):
+    """Like IntCode.execute(), counting everything into machine.profile."""
+    profile = machine.profile
+    opcodes, ips, back_edges = profile.opcodes, profile.ips, profile.back_edges
+    mem, load, store = machine.memory, machine.load, machine.store
+    ip, rb, steps = machine.ip, machine.rb, machine.steps
+    high, io_seconds, inputs, outputs = profile.high_water, 0.0, 0, 0
+    started = steps
+    t0 = perf_counter()
+    try:
+        check_at = next_check(steps, limit, deadline)
+        while True:
+            word = mem[ip]
+            op, m1, m2, m3 = OPCODES[word]
+            if op == 99:
+                break
+            opcodes[word] += 1
+            ips[ip] += 1
+
+            a = mem[ip + 1]
+            if op == 3:
+                if m1:
+                    a += rb
+                t = perf_counter()
+                inputs += 1
+                machine.steps = steps
+                value = do_input()
+                io_seconds += perf_counter() - t
+                if value is None:
+                    opcodes[word] -= 1  # repeated when resumed
+                    ips[ip] -= 1
+                    break
+                store(a, value)
+                mem = machine.memory
+                if a > high:
+                    high = a
+                ip += 2
+                steps += 1
+                continue
+            if m1 == 0:
+                a = mem[a] if a < len(mem) else load(a)
+            elif m1 == 2:
+                a += rb
+                a = mem[a] if a < len(mem) else load(a)
+
+            if op == 4:
+                ip += 2
+                steps += 1
+                t = perf_counter()
+                outputs += 1
+                paused = do_output(a)
+                io_seconds += perf_counter() - t
+                if paused:
+                    break
+                if machine.cow:
+                    machine.own_memory()
+                    mem = machine.memory
+                continue
+            if op == 9:
+                rb += a
+                ip += 2
+                steps += 1
+                continue
+
+            b = mem[ip + 2]
+            if m2 == 0:
+                b = mem[b] if b < len(mem) else load(b)
+            elif m2 == 2:
+                b += rb
+                b = mem[b] if b < len(mem) else load(b)
+
+            if op == 5 or op == 6:
+                if (a != 0) == (op == 5):
+                    if b <= ip:
+                        back_edges[ip, b] += 1
+                    ip = b
+                else:
+                    ip += 3
+                steps += 1
+                if steps >= check_at:
+                    check_at = next_check(steps, limit, deadline)
+                continue
+            else:
+                c = mem[ip + 3]
+                if m3:
+                    c += rb
+                if op == 1:
+                    a += b
+                elif op == 2:
+                    a *= b
+                elif op == 7:
+                    a = 1 if a < b else 0
+                else:
+                    a = 1 if a == b else 0
+                if c < len(mem):
+                    mem[c] = a
+                else:
+                    store(c, a)
+                if c > high:
+                    high = c
+                ip += 4
+            steps += 1
+    finally:
+        machine.ip, machine.rb, machine.steps = ip, rb, steps
+        profile.runs += 1
+        profile.steps += steps - started
+        profile.seconds += perf_counter() - t0
+        profile.io_seconds += io_seconds
+        profile.inputs += inputs
+        profile.outputs += outputs
+        profile.high_water = high
+        profile.dense_cells = max(profile.dense_cells, len(machine.memory))
+        profile.sparse_pages = max(profile.sparse_pages, len(machine.pages))
+    return machine
+
+
+def main(script, json_path=None):
+    """Run a day script with every IntCode machine profiled."""
+    profile = intcode.PROFILE = Profile()
+    t0 = perf_counter()
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit:
+        pass
+    finally:
+        intcode.PROFILE = None
+    wall = perf_counter() - t0
+    print(f'--- Profile of {script}:', file=sys.stderr)
+    print(profile.report(wall), file=sys.stderr)
+    if json_path is not None:
+        with open(json_path, 'w') as f:
+            f.write(profile.to_json(indent=1))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,167 @@
+"""Single-producer/single-consumer ring buffers of int64 in shared memory.
+
+Used as a faster alternative to multiprocessing.Queue for talking to IntCode
+machines running in subprocesses (see IntCode.start_in_subprocess()). Values
+are moved in batches and never pickled, and there are no locks: the producer
+only ever advances the 'head' counter, and the consumer only the 'tail'.
+This relies on aligned 8-byte stores being atomic and not reordered with
+each other, which holds on x86-64. Python gives no memory barriers to make
+it hold elsewhere (e.g. on arm64, where the consumer could see a new head
+before the values written under it), so RingBuffer refuses to run there.
+
+Only values that fit in int64 can be sent; others raise OverflowError in the
+producer, and the consumer then gets EOFError once the ring is closed.
+"""
+from collections import deque
+from multiprocessing import shared_memory
+import platform
+from time import monotonic, sleep
+
+HEAD, TAIL, CLOSED = 0, 1, 2  # header slots
+HEADER = 3
+DONE, FAILED = 1, 2  # values of the CLOSED slot
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+SUPPORTED = platform.machine().lower() in {'x86_64', 'amd64'}
+
+
+def overflow(value):
+    return OverflowError(f'{value} does not fit in a ring buffer')
+
+
+def wait(spins):
+    """Back off progressively while polling."""
+    sleep(0 if spins < 1000 else 0.0001)
+
+
+class RingBuffer:
+    def __init__(self, capacity=4096, name=None):
+        if not SUPPORTED:
+            raise RuntimeError(f'Ring buffers need x86-64 memory ordering, '
+                               f'not {platform.machine()}')
+        if name is None:
+            size = 8 * (HEADER + capacity)
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.slots = self.shm.buf.cast('q')
+        self.capacity = capacity
+        self.received = deque()  # consumer side: values read, not yet got
+        self.unsent = []  # producer side: values not yet published
+
+    def __reduce__(self):  # attach to the same buffer when unpickled
+        return self.__class__, (self.capacity, self.shm.name)
+
+    def put(self, value):
+        self.put_many([value])
+
+    def put_many(self, values, block=True):
+        """Publish values, waiting for free space as needed.
+
+        Without 'block', publish what fits right now. Return number published.
+        Raise OverflowError, publishing nothing, if a value is not an int64.
+        """
+        if values and (min(values) < INT64_MIN or max(values) > INT64_MAX):
+            raise overflow(next(v for v in values
+                                if not INT64_MIN <= v <= INT64_MAX))
+        slots, capacity = self.slots, self.capacity
+        head, i, spins = slots[HEAD], 0, 0
+        while i < len(values):
+            free = capacity - (head - slots[TAIL])
+            if free == 0:
+                if not block:
+                    break
+                wait(spins)
+                spins += 1
+                continue
+            n = min(free, len(values) - i)
+            for value in values[i:i + n]:
+                slots[HEADER + head % capacity] = value
+                head += 1
+            slots[HEAD] = head
+            i += n
+        return i
+
+    def buffer(self, value):
+        """Like .put(), but batched until .flush(), or the batch is full."""
+        if not INT64_MIN <= value <= INT64_MAX:
+            self.flush()  # values before it still get through
+            raise overflow(value)
+        self.unsent.append(value)
+        if len(self.unsent) >= self.capacity:
+            self.flush()
+
+    def flush(self):
+        if self.unsent:
+            self.put_many(self.unsent)
+            self.unsent = []
+
+    def close(self, failed=False):
+        """Producer is done; consumers get EOFError when the ring is empty.
+
+        The ring is closed even if the unsent values can't be published, and
+        is then marked as 'failed', like when 'failed' is given.
+        """
+        try:
+            self.flush()
+        except OverflowError:
+            failed = True
+            raise
+        finally:
+            self.slots[CLOSED] = FAILED if failed else DONE
+
+    def get(self, timeout=None):
+        """Return the next value, waiting for it if necessary."""
+        if not self.received:
+            self.receive(timeout)
+        return self.received.popleft()
+
+    def get_many(self):
+        """Return all values available right now (maybe none)."""
+        slots, capacity = self.slots, self.capacity
+        head, tail = slots[HEAD], slots[TAIL]
+        values = list(self.received)
+        self.received.clear()
+        while tail < head:
+            values.append(slots[HEADER + tail % capacity])
+            tail += 1
+        slots[TAIL] = tail
+        return values
+
+    def receive(self, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        spins = 0
+        while True:
+            values = self.get_many()
+            if values:
+                self.received.extend(values)
+                return
+            closed = self.slots[CLOSED]
+            if closed and self.slots[HEAD] == self.slots[TAIL]:
+                if closed == FAILED:
+                    raise EOFError('Ring buffer closed by failed producer')
+                raise EOFError('Ring buffer closed')
+            if deadline is not None and monotonic() > deadline:
+                raise TimeoutError('Nothing received from ring buffer')
+            wait(spins)
+            spins += 1
+
+    def unlink(self):
+        """Release the shared memory; call once, when done with the ring."""
+        self.slots.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+def serve(program, inbox, outbox):
+    """Run 'program' with I/O through the given ring buffers."""
+    def do_input():
+        outbox.flush()  # the other side may wait for this before replying
+        return inbox.get()
+
+    try:
+        program.setup(do_input, outbox.buffer).run()
+    except BaseException:
+        outbox.close(failed=True)
+        raise
+    outbox.close()
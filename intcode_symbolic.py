@@ -0,0 +1,201 @@
+"""Run IntCode programs with some memory cells holding symbolic variables.
+
+Values computed from the variables by additions and multiplications are kept
+as polynomials (Poly) over them. Anything else derived from a variable (a
+comparison, or a read through a symbolic address) becomes UNKNOWN, which is
+fine as long as it is overwritten before it matters. Where the variables
+would decide control flow (an opcode, jump, relative base adjustment or the
+address of a write), NotSymbolic is raised, and the caller should fall back
+to running the program concretely.
+"""
+from typing import Dict, Tuple
+
+from intcode import OPCODES
+
+
+class NotSymbolic(Exception):
+    pass
+
+
+class Unknown:
+    def __repr__(self):
+        return 'UNKNOWN'
+
+
+UNKNOWN = Unknown()
+
+Monomial = Tuple[Tuple[str, int], ...]  # sorted (variable, exponent) pairs
+
+
+def mono_mul(a, b):
+    exps = dict(a)
+    for var, exp in b:
+        exps[var] = exps.get(var, 0) + exp
+    return tuple(sorted(exps.items()))
+
+
+class Poly:
+    """A polynomial with integer coefficients. Constants are plain ints."""
+
+    def __init__(self, terms: Dict[Monomial, int]):
+        self.terms = {m: c for m, c in terms.items() if c}
+
+    @classmethod
+    def var(cls, name):
+        return cls({((name, 1), ): 1})
+
+    @staticmethod
+    def lift(value):
+        return value if isinstance(value, Poly) else Poly({(): value})
+
+    def simplify(self):
+        """Return self, or a plain int if there are no variables left."""
+        if not self.terms:
+            return 0
+        if list(self.terms) == [()]:
+            return self.terms[()]
+        return self
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for m, c in self.lift(other).terms.items():
+            terms[m] = terms.get(m, 0) + c
+        return Poly(terms).simplify()
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        terms = {}
+        for m1, c1 in self.terms.items():
+            for m2, c2 in self.lift(other).terms.items():
+                m = mono_mul(m1, m2)
+                terms[m] = terms.get(m, 0) + c1 * c2
+        return Poly(terms).simplify()
+
+    __rmul__ = __mul__
+
+    def substitute(self, name, value):
+        """Return polynomial (or int) with variable 'name' set to 'value'."""
+        terms = {}
+        for m, c in self.terms.items():
+            exps = dict(m)
+            c *= value ** exps.pop(name, 0)
+            m = tuple(sorted(exps.items()))
+            terms[m] = terms.get(m, 0) + c
+        return Poly(terms).simplify()
+
+    def coefficients(self, name):
+        """Return {exponent: coefficient} of self as a polynomial in 'name'."""
+        parts = {}
+        for m, c in self.terms.items():
+            exps = dict(m)
+            exp = exps.pop(name, 0)
+            parts.setdefault(exp, {})[tuple(sorted(exps.items()))] = c
+        return {e: Poly(terms).simplify() for e, terms in parts.items()}
+
+    def __repr__(self):
+        return ' + '.join(
+            '*'.join(([str(c)] if c != 1 or not m else [])
+                     + [v if e == 1 else f'{v}**{e}' for v, e in m])
+            for m, c in sorted(self.terms.items()))
+
+
+def concrete(value, what):
+    if not isinstance(value, int):
+        raise NotSymbolic(f'{what} depends on symbolic values: {value}')
+    return value
+
+
+def run_symbolic(program, symbols, max_steps=10**6):
+    """Run a copy of 'program' with memory[a] = Poly.var(name).
+
+    'symbols' maps addresses to variable names. Return (memory, outputs)
+    after the program halts. The program must not take any input.
+    """
+    mem = list(program.memory)
+    assert not program.pages, 'sparse memory is not supported'
+    for address, name in symbols.items():
+        mem[address] = Poly.var(name)
+    ip, rb, outputs = program.ip, program.rb, []
+
+    def address(i, mode):
+        a = concrete(mem[ip + i], 'parameter')
+        if mode == 2:
+            a += rb
+        if a >= len(mem):
+            mem.extend([0] * (a + 1 - len(mem)))
+        return a
+
+    def read(i, mode):
+        if mode == 1:
+            return mem[ip + i]
+        if not isinstance(mem[ip + i], int):
+            return UNKNOWN  # read through a symbolic address
+        return mem[address(i, mode)]
+
+    for _ in range(max_steps):
+        op, m1, m2, m3 = OPCODES[concrete(mem[ip], f'opcode at {ip}')]
+        if op == 99:
+            return mem, outputs
+        elif op == 3:
+            raise NotSymbolic('input is not supported')
+        elif op == 4:
+            outputs.append(read(1, m1))
+            ip += 2
+        elif op == 9:
+            rb += concrete(read(1, m1), f'relative base at {ip}')
+            ip += 2
+        elif op in {5, 6}:
+            a = concrete(read(1, m1), f'jump at {ip}')
+            if (a != 0) == (op == 5):
+                ip = concrete(read(2, m2), f'jump target at {ip}')
+            else:
+                ip += 3
+        else:
+            a, b = read(1, m1), read(2, m2)
+            if a is UNKNOWN or b is UNKNOWN:
+                result = UNKNOWN
+            elif op == 1:
+                result = a + b
+            elif op == 2:
+                result = a * b
+            elif isinstance(a, int) and isinstance(b, int):
+                result = int(a < b) if op == 7 else int(a == b)
+            else:
+                result = UNKNOWN
+            mem[address(3, m3)] = result
+            ip += 4
+    raise NotSymbolic(f'no halt within {max_steps} steps')
+
+
+def solve(poly, target, domains):
+    """Yield {name: value} from 'domains' for which poly == target.
+
+    'domains' maps variable names to ranges; assignments are yielded in
+    lexicographic order. The last variable is solved for directly where the
+    polynomial is linear in it.
+    """
+    names = list(domains)
+
+    def search(p, i, assigned):
+        name, domain = names[i], domains[names[i]]
+        if i == len(names) - 1:
+            coeffs = Poly.lift(p).coefficients(name)
+            if set(coeffs) <= {0, 1}:  # p == a * name + b
+                a, b = coeffs.get(1, 0), coeffs.get(0, 0)
+                if a == 0:
+                    values = domain if b == target else []
+                else:
+                    value, rest = divmod(target - b, a)
+                    values = [value] if not rest and value in domain else []
+            else:
+                values = [v for v in domain
+                          if Poly.lift(p).substitute(name, v) == target]
+            for value in values:
+                yield dict(assigned, **{name: value})
+            return
+        for value in domain:
+            q = Poly.lift(p).substitute(name, value)
+            yield from search(q, i + 1, dict(assigned, **{name: value}))
+
+    return search(poly, 0, {})
@@ -0,0 +1,284 @@
+"""Record the inputs of IntCode machines, and replay them.
+
+Given its starting state, a machine's execution is fully determined by the
+values it reads, so a trace only holds those, each with the instruction
+count at which it was read. A trace may hold several streams (one per
+machine), e.g. for a whole day 23 network.
+
+The trace format is a magic string followed by records. All numbers are
+LEB128 varints, with signed ones zigzag-encoded first. Each record starts
+with 2 * stream + kind:
+  kind 0, input: steps since the previous input in the stream, value
+  kind 1, start: 32 bytes SHA-256 of the machine's image and state, steps
+Streams start in order, before any of their inputs.
+
+Usage: python3 intcode_trace.py TRACE PROGRAM [STREAM [STEPS]]
+replays a stream of a trace against the program in file PROGRAM, and shows
+the machine state after STEPS instructions (or after the last input).
+"""
+from dataclasses import dataclass, field
+import sys
+from typing import List, Tuple
+
+from intcode import OPCODES, BudgetExceeded, IntCode
+from intcode_cache import digest
+
+MAGIC = b'ICTRACE1'
+INPUT, START = 0, 1
+FLUSH_EVENTS = 1 << 14  # inputs buffered before encoding and writing
+SINGLE_STEPS = 1000  # replay the last instructions before a target singly
+
+
+class TraceMismatch(Exception):
+    pass
+
+
+def encode(n, out):
+    """Append unsigned varint to bytearray 'out'."""
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def decode(data, pos):
+    """Return (unsigned varint at data[pos], position after it)."""
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+
+def unzigzag(n):
+    return -((n + 1) >> 1) if n & 1 else n >> 1
+
+
+class TraceWriter:
+    def __init__(self, f):
+        self.f = f  # binary file
+        self.buf = bytearray(MAGIC)
+        self.events = []  # (stream, steps, value) not yet encoded
+        self.last = []  # per stream: steps at the last encoded input
+        self.images = {}  # memo for image(); see there
+
+    def image(self, machine):
+        """Return digest of the machine, without its pending inputs.
+
+        Memory shared copy-on-write never changes, so its digest is computed
+        only once (e.g. for all the forks of one program in a network).
+        """
+        if not machine.cow:
+            return digest(machine, pending=False)
+        key = id(machine.memory), id(machine.pages), machine.ip, machine.rb
+        if key not in self.images:  # keep memory alive, so ids stay unique
+            self.images[key] = (digest(machine, pending=False),
+                                machine.memory, machine.pages)
+        return self.images[key][0]
+
+    def attach(self, machine):
+        """Record the inputs of 'machine' (from now on) in a new stream.
+
+        Machines forked from it later are not recorded.
+        """
+        self.encode_events()
+        n = len(self.last)
+        self.last.append(machine.steps)
+        encode(2 * n + START, self.buf)
+        self.buf += self.image(machine)  # pending inputs will be recorded
+        encode(machine.steps, self.buf)
+        machine.trace = Stream(self, n)
+        return machine
+
+    def encode_events(self):
+        buf, last = self.buf, self.last
+        for n, steps, value in self.events:
+            encode(2 * n + INPUT, buf)
+            encode(steps - last[n], buf)
+            encode(value << 1 if value >= 0 else (-value << 1) - 1, buf)
+            last[n] = steps
+        self.events.clear()
+
+    def flush(self):
+        self.encode_events()
+        self.f.write(self.buf)
+        self.buf = bytearray()
+
+    def close(self):
+        self.flush()
+        self.f.flush()
+
+
+@dataclass
+class Stream:
+    writer: TraceWriter
+    n: int
+
+    def recorder(self, machine, do_input):
+        """Wrap do_input to record the values read by 'machine'."""
+        writer, events, n = self.writer, self.writer.events, self.n
+
+        def record():
+            value = do_input()
+            if value is not None:
+                events.append((n, machine.steps, value))
+                if len(events) >= FLUSH_EVENTS:
+                    writer.flush()
+            return value
+
+        return record
+
+
+@dataclass
+class StreamTrace:
+    image: bytes  # digest() of the machine when recording started
+    start: int  # steps when recording started
+    inputs: List[Tuple[int, int]] = field(default_factory=list)  # (steps, v)
+
+
+def read_trace(data):
+    """Return a list of StreamTrace from the bytes of a trace."""
+    if not data.startswith(MAGIC):
+        raise ValueError('Not an IntCode trace')
+    streams, last = [], []
+    pos = len(MAGIC)
+    while pos < len(data):
+        head, pos = decode(data, pos)
+        n, kind = divmod(head, 2)
+        if kind == START:
+            image, pos = bytes(data[pos:pos + 32]), pos + 32
+            steps, pos = decode(data, pos)
+            assert n == len(streams), 'streams must start in order'
+            streams.append(StreamTrace(image, steps))
+            last.append(steps)
+        else:
+            delta, pos = decode(data, pos)
+            value, pos = decode(data, pos)
+            last[n] += delta
+            streams[n].inputs.append((last[n], unzigzag(value)))
+    return streams
+
+
+def step(machine):
+    """Execute exactly one instruction.
+
+    Return False if none was executed: the machine has halted, or its input
+    paused it.
+    """
+    op, m1, m2, m3 = OPCODES[machine.load(machine.ip)]
+    if op == 99:
+        return False
+    ip, rb, load = machine.ip, machine.rb, machine.load
+
+    def read(i, mode):
+        a = load(ip + i)
+        if mode == 1:
+            return a
+        return load(a + rb if mode == 2 else a)
+
+    def target(i, mode):
+        return load(ip + i) + (rb if mode == 2 else 0)
+
+    if op == 3:
+        value = machine.do_input()
+        if value is None:
+            return False
+        machine.store(target(1, m1), value)
+        machine.ip += 2
+    elif op == 4:
+        machine.ip += 2
+        machine.steps += 1
+        machine.do_output(read(1, m1))
+        return True
+    elif op == 9:
+        machine.rb += read(1, m1)
+        machine.ip += 2
+    elif op in {5, 6}:
+        a, b = read(1, m1), read(2, m2)
+        machine.ip = b if (a != 0) == (op == 5) else ip + 3
+    else:
+        a, b = read(1, m1), read(2, m2)
+        result = {1: a + b, 2: a * b, 7: int(a < b), 8: int(a == b)}[op]
+        machine.store(target(3, m3), result)
+        machine.ip += 4
+    machine.steps += 1
+    return True
+
+
+def replay(program, trace, until=None, jit=False):
+    """Return a copy of 'program' re-run with the inputs from 'trace'.
+
+    'trace' is a StreamTrace recorded from a machine in the same state as
+    'program'. The copy stops after exactly 'until' instructions (counting
+    like .steps), or when it needs input beyond the trace, or halts. Its
+    outputs are collected in .outputs.
+    """
+    if digest(program, pending=False) != trace.image:
+        raise TraceMismatch('Trace was recorded from a different machine')
+    if program.steps != trace.start:
+        raise TraceMismatch(f'Trace starts at step {trace.start}, '
+                            f'machine is at step {program.steps}')
+    inputs, next_input = trace.inputs, 0
+
+    def do_input():
+        nonlocal next_input
+        if next_input == len(inputs):
+            return None  # pause
+        steps, value = inputs[next_input]
+        if steps != machine.steps:
+            raise TraceMismatch(f'Input at step {machine.steps}, but trace '
+                                f'has it at step {steps}')
+        next_input += 1
+        return value
+
+    machine = program.setup(do_input, [])
+    if until is None:
+        return machine.run(jit)
+    while machine.steps < until:
+        remaining = until - machine.steps
+        if remaining <= SINGLE_STEPS:
+            if not step(machine):
+                break
+            continue
+        # Run most of the way; the budget may overshoot to the next jump
+        snapshot = machine.snapshot()
+        state = next_input, len(machine.outputs)
+        try:
+            machine.run(jit, max_steps=remaining - SINGLE_STEPS)
+            break  # halted or paused
+        except BudgetExceeded:
+            if machine.steps > until:  # overshot; take it one by one
+                machine.restore(snapshot)
+                next_input = state[0]
+                while len(machine.outputs) > state[1]:
+                    machine.outputs.pop()
+                while machine.steps < until and step(machine):
+                    pass
+    return machine
+
+
+def main(trace_path, program_path, stream='0', steps=None):
+    from intcode_profile import disassemble
+
+    with open(trace_path, 'rb') as f:
+        trace = read_trace(f.read())[int(stream)]
+    with open(program_path) as f:
+        program = IntCode.from_file(f)
+    until = None if steps is None else int(steps)
+    machine = replay(program, trace, until)
+    print(f'Replayed {len(trace.inputs)} inputs: step {machine.steps}, '
+          f'ip {machine.ip}, rb {machine.rb}, '
+          f'{len(machine.outputs)} outputs')
+    print(disassemble(machine.memory, start=machine.ip,
+                      end=machine.ip + 4)[0])
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,146 @@
+"""Draw 2-D grids as text, on terminals or into files.
+
+A frame is built as a list of row strings, from either a compact Grid or a
+sparse map (a dict or set of (x, y), or a callable) within a bounding box,
+and written out in a single write() by a Screen.
+"""
+import sys
+from time import monotonic, sleep
+
+MISSING = object()  # value of cells not in a mapping
+
+
+def style(text, sgr):
+    """Return 'text' highlighted with ANSI SGR code 'sgr' (e.g. '33;1')."""
+    return f'\x1b[{sgr}m{text}\x1b[0m'
+
+
+class Bounds:
+    """Bounding box of points, kept up to date as points are added."""
+
+    def __init__(self, points=()):
+        self.lo = self.hi = None  # (x, y) corners
+        for pos in points:
+            self.add(pos)
+
+    def add(self, pos):
+        x, y = pos
+        if self.lo is None:
+            self.lo = self.hi = (x, y)
+        elif not (self.lo[0] <= x <= self.hi[0]
+                  and self.lo[1] <= y <= self.hi[1]):
+            self.lo = min(self.lo[0], x), min(self.lo[1], y)
+            self.hi = max(self.hi[0], x), max(self.hi[1], y)
+
+    def box(self, margin=0):
+        """Return corners (x, y) of the box, grown by 'margin' all round.
+
+        Raise ValueError if there are no points.
+        """
+        if self.lo is None:
+            raise ValueError('No points to bound')
+        (x0, y0), (x1, y1) = self.lo, self.hi
+        return (x0 - margin, y0 - margin), (x1 + margin, y1 + margin)
+
+
+def bbox(points):
+    """Return corners (x, y) of the smallest box with all 'points'."""
+    return Bounds(points).box()
+
+
+def rows(source, pixels, box=None, overlay=None, missing=' ', flip=False):
+    """Return the rows of text showing 'source' within 'box'.
+
+    'source' is a Grid, or a mapping or callable from (x, y) to values, or a
+    set of (x, y) (mapped to True, and False elsewhere). 'pixels' maps
+    values to text (a dict, list or string). Cells not in a mapping show
+    'missing'. 'overlay' maps (x, y) to text shown instead of the pixel
+    there. 'box' defaults to the bbox of a Grid, or of the keys of a
+    mapping or set. With 'flip', rows are listed bottom (largest y) first.
+    """
+    if box is None:
+        box = source.bbox() if hasattr(source, 'cells') else bbox(source)
+    (x0, y0), (x1, y1) = box
+    overlay = {pos: text for pos, text in (overlay or {}).items()
+               if x0 <= pos[0] <= x1 and y0 <= pos[1] <= y1}
+    cells = getattr(source, 'cells', None)
+    if isinstance(source, (set, frozenset)):
+        get = source.__contains__
+    elif cells is not None:
+        get = source.__getitem__
+    elif callable(source):
+        get = source
+    else:  # a mapping, which may be missing cells
+        pixels = dict(pixels.items() if hasattr(pixels, 'items')
+                      else enumerate(pixels))
+        pixels[MISSING] = missing
+
+        def get(pos):
+            return source.get(pos, MISSING)
+
+    if cells is not None:  # translate rows of bytes in one go
+        table = {v: pixels[v] for v in set(cells)}
+    lines = {y: [] for x, y in overlay}
+    for (x, y), text in overlay.items():
+        lines[y].append((x, text))
+    out = []
+    for y in range(y1, y0 - 1, -1) if flip else range(y0, y1 + 1):
+        if (cells is not None and y not in lines and source.x0 <= x0
+                and x1 < source.x0 + source.width
+                and source.y0 <= y < source.y0 + source.height):
+            start = (y - source.y0) * source.width + x0 - source.x0
+            out.append(cells[start:start + x1 + 1 - x0].decode('latin-1')
+                       .translate(table))
+            continue
+        row = [pixels[get((x, y))] for x in range(x0, x1 + 1)]
+        for x, text in lines.get(y, ()):
+            row[x - x0] = text
+        out.append(''.join(row))
+    return out
+
+
+class Screen:
+    """Writes frames (lists of rows) to a text stream, one write() each.
+
+    On a terminal (or with 'diff'), only rows that changed since the
+    previous frame are redrawn, using ANSI cursor moves. Changed rows are
+    redrawn whole: they may hold ANSI styles, which put string offsets and
+    screen columns out of step. Otherwise (e.g. into a file, for offline
+    viewing) whole frames are written, separated by blank lines. With 'fps',
+    frames are shown at most that often by wall clock; with 'pace', show()
+    then waits for the next frame time, otherwise frames coming too early
+    are dropped.
+    """
+
+    def __init__(self, out=None, fps=None, pace=True, diff=None):
+        self.out = sys.stdout if out is None else out
+        if diff is None:
+            diff = self.out.isatty()
+        self.diff, self.pace = diff, pace
+        self.interval = 0 if fps is None else 1 / fps
+        self.next_frame = 0  # monotonic() time of next frame
+        self.shown = None  # rows on screen
+
+    def show(self, frame):
+        """Show 'frame' (a list of rows). Return False if it was dropped."""
+        if self.interval:
+            now = monotonic()
+            if now < self.next_frame:
+                if not self.pace:
+                    return False
+                sleep(self.next_frame - now)
+                now = self.next_frame
+            self.next_frame = now + self.interval
+        if not self.diff:
+            text = '\n'.join(frame) + '\n\n'
+        elif self.shown is None or len(self.shown) != len(frame):
+            text = '\x1b[2J\x1b[H' + '\x1b[K\n'.join(frame) + '\x1b[K\n'
+        else:
+            parts = [f'\x1b[{y + 1};1H{row}\x1b[K'
+                     for y, (row, old) in enumerate(zip(frame, self.shown))
+                     if row != old]
+            text = ''.join(parts) + f'\x1b[{len(frame) + 1};1H'
+        self.shown = frame
+        self.out.write(text)
+        self.out.flush()
+        return True